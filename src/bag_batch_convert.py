@@ -0,0 +1,223 @@
+import os
+import io
+import json
+import time
+import fnmatch
+import argparse
+import threading
+import contextlib
+import multiprocessing
+import topic_cache
+import bag_converter
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def find_bags(roots):
+    """
+    Returns every rosbag2 directory (metadata.yaml next to .db3 or .db3.zstd
+    splits) below the given roots, sorted by path. Bag directories are not
+    searched further.
+    """
+    bag_dirs = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            if "metadata.yaml" in filenames and any(name.endswith((".db3", ".db3.zstd")) for name in filenames):
+                bag_dirs.append(os.path.abspath(dirpath))
+                dirnames[:] = []
+            else:
+                dirnames.sort()
+    return sorted(set(bag_dirs))
+
+
+def _select_topics(topic_names, patterns):
+    if not patterns:
+        return list(topic_names)
+    return [name for name in topic_names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def read_job_log(path):
+    # (bag, topic, ext) -> last logged record; a truncated last line from an interrupted run is ignored
+    jobs = {}
+    if not os.path.exists(path):
+        return jobs
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            jobs[(record["bag"], record["topic"], record["ext"])] = record
+    return jobs
+
+
+def plan_jobs(bag_dirs, topic_patterns=None, cache_exts=("feather",), arrays="explode", job_log=None, retry_failed=False):
+    """
+    Returns one job per bag with the (topic, cache extensions, message count)
+    whose caches are missing or out of date according to the cache manifest.
+    Topics that failed in an earlier run (per job_log) are skipped unless
+    retry_failed is set.
+    """
+    job_log = job_log or {}
+    jobs = []
+    for bag_dir in bag_dirs:
+        converter = bag_converter.BagConverter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter.connectDB(bag_dir)
+        if converter.reader is None:
+            print(f"[WARN] Skipping unreadable bag: {bag_dir}")
+            continue
+        try:
+            # counts from metadata.yaml and the cache manifest, so compressed splits are not decompressed here
+            bag_topics = converter.reader.getTopics()
+            topics = []
+            for topic_name in _select_topics(bag_topics, topic_patterns):
+                count = bag_topics[topic_name]["message_count"]
+                if count is None:
+                    count = converter._countTopicMessages(topic_name, (None, None))
+                if count == 0:
+                    continue
+                pending = []
+                for ext in cache_exts:
+                    logged = job_log.get((bag_dir, topic_name, ext))
+                    if logged is not None and logged["status"] == "failed" and not retry_failed:
+                        continue
+                    if os.path.exists(converter._get_topic_cache_path(topic_name, ext, arrays)) and \
+                            converter._checkCache(topic_name, ext, arrays)[0] == "fresh":
+                        continue
+                    pending.append(ext)
+                if pending:
+                    topics.append((topic_name, pending, count))
+        finally:
+            converter._closeDB()
+        if topics:
+            jobs.append((bag_dir, topics))
+    return jobs
+
+
+def _write_caches(converter, bag_dir, topic_name, exts, count, df, arrays, chunk_size, queue):
+    for ext in exts:
+        record = {"bag": bag_dir, "topic": topic_name, "ext": ext, "messages": count}
+        startTime = time.perf_counter()
+        try:
+            if df is None:
+                df = converter.getTopicDataWithPandas(topic_name, cache_ext=ext, chunk_size=chunk_size, arrays=arrays)
+            else:
+                # written from the frame of the bag scan or of the first format
+                converter.saveCache({topic_name: df}, ext, arrays)
+                converter._recordCache(topic_name, ext, df, arrays)
+            record.update(status="done", rows=len(df))
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        record.update(seconds=time.perf_counter() - startTime, finished=time.strftime("%Y-%m-%dT%H:%M:%S%z"))
+        queue.put(record)
+
+
+def _convert_bag(bag_dir, topics, arrays, chunk_size, build_index, queue):
+    # runs in a pool process; every finished (topic, ext) is reported through the queue right away
+    converter = bag_converter.BagConverter()
+    # every topic is converted once here, so the process-wide memory cache would only hold on to them
+    converter.frame_cache = None
+    pending = {topic_name: (exts, count) for topic_name, exts, count in topics}
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        converter.connectDB(bag_dir, build_index)
+        try:
+            # all pending topics in one scan of the bag, then cached one topic at a time
+            for topic_name, df in converter._iterTopicsFromDB(list(pending), chunk_size, arrays):
+                exts, count = pending.pop(topic_name)
+                _write_caches(converter, bag_dir, topic_name, exts, count, df, arrays, chunk_size, queue)
+                del df
+        except Exception:
+            # a failing topic is isolated below by converting the remaining topics one at a time
+            pass
+        for topic_name, (exts, count) in pending.items():
+            _write_caches(converter, bag_dir, topic_name, exts, count, None, arrays, chunk_size, queue)
+    converter._closeDB()
+
+
+def run_batch(jobs, log_path, workers=None, arrays="explode", chunk_size=50_000, build_index=False):
+    """
+    Converts the planned jobs with one bag per pool process, reading all pending
+    topics of a bag in one scan. The scanned chunks are spilled to TMPDIR, so a
+    process holds one whole topic at a time. Progress is counted in messages over all bags,
+    and every finished (bag, topic, ext) is appended to the JSON lines job log,
+    so an interrupted run resumes where it stopped.
+
+    Returns the number of failed conversions.
+    """
+    total = sum(count * len(exts) for _, topics in jobs for _, exts, count in topics)
+    failed = 0
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager, open(log_path, "a") as log, \
+            tqdm(desc="  Progress [batch]", unit="msg", total=total) as progress:
+        queue = manager.Queue()
+
+        def drain():
+            nonlocal failed
+            while (record := queue.get()) is not None:
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+                progress.update(record["messages"])
+                if record["status"] == "failed":
+                    failed += 1
+                    progress.write(f"[ERROR] {record['bag']} {record['topic']} ({record['ext']}): {record['error']}")
+
+        reporter = threading.Thread(target=drain)
+        reporter.start()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = {
+                    executor.submit(_convert_bag, bag_dir, topics, arrays, chunk_size, build_index, queue): bag_dir
+                    for bag_dir, topics in jobs
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        progress.write(f"[ERROR] {futures[future]}: {type(e).__name__}: {e}")
+        finally:
+            queue.put(None)
+            reporter.join()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert every bag below a directory tree into topic caches")
+    parser.add_argument("roots", nargs="*", default=["bag"], help="directories searched recursively for bags (default: bag)")
+    parser.add_argument("--topics", nargs="*", help="topic names or glob patterns such as '/sg/*' (default: all)")
+    parser.add_argument("--cache-ext", nargs="*", default=["feather"], choices=topic_cache.cache_extensions)
+    parser.add_argument("--arrays", default="explode", choices=["explode", "column"])
+    parser.add_argument("--workers", type=int, default=None, help="bags converted in parallel (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--build-index", action="store_true",
+                        help="write companion (topic_id, timestamp) index files next to splits without one")
+    parser.add_argument("--log", help="JSON lines job log (default: <first root>/bag_batch_convert.jsonl)")
+    parser.add_argument("--retry-failed", action="store_true", help="retry topics that failed in an earlier run")
+    parser.add_argument("--dry-run", action="store_true", help="only list the conversions that would run")
+    args = parser.parse_args()
+
+    if args.arrays == "column" and "csv" in args.cache_ext:
+        parser.error("array columns cannot be cached as csv")
+    log_path = args.log or os.path.join(args.roots[0], "bag_batch_convert.jsonl")
+
+    bag_dirs = find_bags(args.roots)
+    jobs = plan_jobs(bag_dirs, args.topics, args.cache_ext, args.arrays, read_job_log(log_path), args.retry_failed)
+    conversions = sum(len(exts) for _, topics in jobs for _, exts, _ in topics)
+    print(f"[INFO] Found {len(bag_dirs)} bags, {conversions} topic caches to convert in {len(jobs)} bags")
+    if args.dry_run:
+        for bag_dir, topics in jobs:
+            for topic_name, exts, count in topics:
+                print(f"  {bag_dir} {topic_name} ({count} messages): {', '.join(exts)}")
+        return
+    if not jobs:
+        return
+
+    failed = run_batch(jobs, log_path, args.workers, args.arrays, args.chunk_size, args.build_index)
+    print(f"[INFO] Converted {conversions - failed} topic caches, {failed} failed; job log: {log_path}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import io
+import glob
+import json
+import time
+import shutil
+import struct
+import sqlite3
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+import numpy as np
+import pandas as pd
+import yaml
+import topic_cache
+import bag_reader
+from conversion_stats import peak_rss_mb
+from concurrent.futures import ProcessPoolExecutor
+
+# topic name -> (message type, period [ns]); the rates follow the strain gauge recordings in plot.ipynb
+benchmark_topics = {
+    "/sg/pressure": ("std_msgs/msg/Float32", 2_000_000),
+    "/sg/wrench": ("geometry_msgs/msg/WrenchStamped", 45_000_000),
+    "/array": ("std_msgs/msg/Float32MultiArray", 100_000_000),
+}
+
+START_TIME = 1_700_000_000_000_000_000
+
+
+class CdrWriter:
+    """
+    Minimal little-endian CDR serializer for the benchmark message types.
+
+    Example:
+        writer = CdrWriter()
+        writer.write("f", 1.0)
+        payload = writer.getvalue()
+    """
+
+    def __init__(self):
+        # encapsulation header: CDR_LE
+        self.buffer = bytearray(b"\x00\x01\x00\x00")
+
+    def _align(self, size):
+        self.buffer += b"\x00" * (-(len(self.buffer) - 4) % size)
+
+    def write(self, fmt, *values):
+        self._align(struct.calcsize(fmt[-1]))
+        self.buffer += struct.pack("<" + fmt, *values)
+
+    def writeString(self, value):
+        encoded = value.encode("utf-8") + b"\x00"
+        self.write("I", len(encoded))
+        self.buffer += encoded
+
+    def writeArray(self, values):
+        self.write("I", len(values))
+        if len(values):
+            self._align(values.dtype.itemsize)
+            self.buffer += values.astype(values.dtype.newbyteorder("<")).tobytes()
+
+    def getvalue(self):
+        return bytes(self.buffer)
+
+
+def serialize_message(topic_type, timestamp, rng, array_size):
+    writer = CdrWriter()
+    if topic_type == "std_msgs/msg/Float32":
+        writer.write("f", rng.standard_normal())
+    elif topic_type == "geometry_msgs/msg/WrenchStamped":
+        writer.write("iI", timestamp // 1_000_000_000, timestamp % 1_000_000_000)
+        writer.writeString("sg_link")
+        writer.write("6d", *rng.standard_normal(6))
+    elif topic_type == "std_msgs/msg/Float32MultiArray":
+        # empty layout.dim, layout.data_offset, then the data sequence
+        writer.write("I", 0)
+        writer.write("I", 0)
+        writer.writeArray(rng.standard_normal(array_size).astype(np.float32))
+    else:
+        raise ValueError(f"Unsupported benchmark message type: {topic_type}")
+    return writer.getvalue()
+
+
+def _create_split(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE topics(id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL,
+                            serialization_format TEXT NOT NULL, offered_qos_profiles TEXT NOT NULL);
+        CREATE TABLE messages(id INTEGER PRIMARY KEY, topic_id INTEGER NOT NULL, timestamp INTEGER NOT NULL, data BLOB NOT NULL);
+        CREATE INDEX timestamp_idx ON messages (timestamp ASC);
+    """)
+    return conn
+
+
+def generate_bag(bag_dir, duration_sec=60.0, array_size=10_000, splits=1, seed=0, compression="none"):
+    """
+    Writes a synthetic rosbag2 sqlite3 bag with metadata.yaml: a 500 Hz Float32
+    topic, a ~22 Hz WrenchStamped topic and a 10 Hz Float32MultiArray topic of
+    array_size elements, split into `splits` equally long db3 files.
+    compression="file" zstd-compresses every split, "message" every BLOB.
+
+    Returns the number of messages per topic.
+    """
+    if compression not in ("none", "file", "message"):
+        raise ValueError(f"Unsupported compression: {compression}")
+    if compression != "none":
+        bag_reader._require_zstandard()
+        compressor = bag_reader.zstandard.ZstdCompressor()
+    if os.path.exists(bag_dir):
+        shutil.rmtree(bag_dir)
+    os.makedirs(bag_dir)
+    name = os.path.basename(os.path.normpath(bag_dir))
+    rng = np.random.default_rng(seed)
+
+    duration = int(duration_sec * 1_000_000_000)
+    events = []
+    for topicID, (topic_name, (topic_type, period)) in enumerate(benchmark_topics.items(), start=1):
+        events += [(timestamp, topicID, topic_type) for timestamp in range(START_TIME, START_TIME + duration, period)]
+    events.sort()
+
+    counts = {topic_name: 0 for topic_name in benchmark_topics}
+    files = []
+    splitDuration = -(-duration // splits)
+    for split in range(splits):
+        relative_path = f"{name}_{split}.db3"
+        conn = _create_split(os.path.join(bag_dir, relative_path))
+        conn.executemany("INSERT INTO topics VALUES (?, ?, ?, 'cdr', '')", [
+            (topicID, topic_name, topic_type)
+            for topicID, (topic_name, (topic_type, _)) in enumerate(benchmark_topics.items(), start=1)
+        ])
+        splitStart = START_TIME + split * splitDuration
+        splitEvents = [event for event in events if splitStart <= event[0] < splitStart + splitDuration]
+        encode = compressor.compress if compression == "message" else bytes
+        conn.executemany("INSERT INTO messages (topic_id, timestamp, data) VALUES (?, ?, ?)", (
+            (topicID, timestamp, encode(serialize_message(topic_type, timestamp, rng, array_size)))
+            for timestamp, topicID, topic_type in splitEvents
+        ))
+        conn.commit()
+        conn.close()
+        if compression == "file":
+            path = os.path.join(bag_dir, relative_path)
+            with open(path, "rb") as src, open(path + ".zstd", "wb") as dst:
+                compressor.copy_stream(src, dst)
+            os.remove(path)
+            relative_path += ".zstd"
+
+        for _, topicID, _ in splitEvents:
+            counts[list(benchmark_topics)[topicID - 1]] += 1
+        files.append({
+            "path": relative_path,
+            "starting_time": {"nanoseconds_since_epoch": splitEvents[0][0] if splitEvents else splitStart},
+            "duration": {"nanoseconds": splitEvents[-1][0] - splitEvents[0][0] if splitEvents else 0},
+            "message_count": len(splitEvents),
+        })
+
+    metadata = {"rosbag2_bagfile_information": {
+        "version": 5,
+        "storage_identifier": "sqlite3",
+        "duration": {"nanoseconds": events[-1][0] - events[0][0]},
+        "starting_time": {"nanoseconds_since_epoch": events[0][0]},
+        "message_count": len(events),
+        "topics_with_message_count": [
+            {
+                "topic_metadata": {"name": topic_name, "type": topic_type, "serialization_format": "cdr", "offered_qos_profiles": ""},
+                "message_count": counts[topic_name],
+            }
+            for topic_name, (topic_type, _) in benchmark_topics.items()
+        ],
+        "compression_format": "" if compression == "none" else "zstd",
+        "compression_mode": "" if compression == "none" else compression.upper(),
+        "relative_file_paths": [entry["path"] for entry in files],
+        "files": files,
+    }}
+    with open(os.path.join(bag_dir, "metadata.yaml"), "w") as f:
+        yaml.safe_dump(metadata, f, sort_keys=False)
+    return counts
+
+
+def _link_bag(bag_path, scratch_dir):
+    # links (copies where symlinks are not allowed) the splits and metadata.yaml of a bag into scratch_dir
+    reader = bag_reader.BagReader(bag_path)
+    if not reader.files:
+        raise FileNotFoundError(f"Bag file not found: {bag_path}")
+    paths = [bag_file.path for bag_file in reader.files]
+    if reader.metadata is not None:
+        paths.append(os.path.join(reader.bag_dir, "metadata.yaml"))
+    for path in paths:
+        target = os.path.join(scratch_dir, os.path.basename(path))
+        try:
+            os.symlink(os.path.abspath(path), target)
+        except OSError:
+            shutil.copy2(path, target)
+    return reader
+
+
+def _remove_caches(bag_dir):
+    for ext in topic_cache.cache_extensions:
+        for path in glob.glob(os.path.join(bag_dir, f"*.{ext}")):
+            os.remove(path)
+    if os.path.exists(os.path.join(bag_dir, topic_cache.MANIFEST_NAME)):
+        os.remove(os.path.join(bag_dir, topic_cache.MANIFEST_NAME))
+
+
+def _run_case(bag_dir, case, topic_name=None, ext=None):
+    # runs in a fresh process, so the peak RSS belongs to this case alone
+    import bag_converter
+
+    converter = bag_converter.BagConverter()
+    if case != "connectDB":
+        converter.connectDB(bag_dir)
+
+    messages = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        startTime = time.perf_counter()
+        if case == "connectDB":
+            converter.connectDB(bag_dir)
+        elif case == "getAllTopicNameAndMessageType":
+            converter.getAllTopicNameAndMessageType()
+        else:
+            messages = len(converter.getTopicDataWithPandas(topic_name, cache_ext=ext))
+        seconds = time.perf_counter() - startTime
+
+    result = {"case": case, "topic": topic_name, "cache_ext": ext, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+    if messages is not None:
+        result["messages"] = messages
+        result["msgs_per_sec"] = messages / seconds if seconds > 0 else None
+        cachePath = converter._get_topic_cache_path(topic_name, ext)
+        result["cache_bytes"] = os.path.getsize(cachePath) if os.path.exists(cachePath) else None
+    converter._closeDB()
+    return result
+
+
+def run_benchmark(bag_path, topics=None, cache_exts=("feather", "csv"), repeat=3):
+    """
+    Times connectDB, getAllTopicNameAndMessageType, a cold getTopicDataWithPandas
+    (conversion and cache write) and a warm cache load per topic and cache
+    extension. Every case runs `repeat` times in a fresh process and the fastest
+    run is kept.
+
+    The bag itself is only read: the cases run on links to its splits in a
+    scratch directory, which is where the caches are written and removed.
+    """
+    import bag_converter
+
+    scratch_dir = tempfile.mkdtemp(prefix="bag_benchmark_")
+    try:
+        reader = _link_bag(bag_path, scratch_dir)
+        converter = bag_converter.BagConverter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter.connectDB(scratch_dir)
+            counts = {topic.topic: int(topic.message_count) for topic in converter.describe().itertuples(index=False)}
+        converter._closeDB()
+        topics = topics or list(counts)
+
+        cases = [("connectDB", None, None), ("getAllTopicNameAndMessageType", None, None)]
+        for topic_name in topics:
+            for ext in cache_exts:
+                cases += [("cold", topic_name, ext), ("warm", topic_name, ext)]
+
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for case, topic_name, ext in cases:
+            runs = []
+            for _ in range(repeat):
+                _remove_caches(scratch_dir)
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    # the warm load reads the cache written by a cold conversion in another process
+                    if case == "warm":
+                        executor.submit(_run_case, scratch_dir, "cold", topic_name, ext).result()
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(_run_case, scratch_dir, case, topic_name, ext).result())
+            best = min(runs, key=lambda run: run["seconds"])
+            best["runs"] = [run["seconds"] for run in runs]
+            results.append(best)
+            label = " ".join(str(value) for value in (case, topic_name, ext) if value is not None)
+            print(f"[INFO] {label}: {best['seconds']:.3f} s" + (
+                f", {best['msgs_per_sec']:.0f} msgs/s" if best.get("msgs_per_sec") else ""
+            ))
+    finally:
+        shutil.rmtree(scratch_dir)
+
+    return {
+        "bag": {
+            "path": os.path.abspath(bag_path),
+            "bytes": sum(os.path.getsize(bag_file.path) for bag_file in reader.files),
+            "message_count": sum(counts.values()),
+            "topics": counts,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BagConverter on a synthetic or recorded bag")
+    parser.add_argument("--bag", help="existing bag directory or .db3 file, only read; a synthetic bag is generated when omitted")
+    parser.add_argument("--duration", type=float, default=60.0, help="synthetic bag length [s]")
+    parser.add_argument("--array-size", type=int, default=10_000, help="elements per Float32MultiArray message")
+    parser.add_argument("--splits", type=int, default=1, help="number of db3 files of the synthetic bag")
+    parser.add_argument("--compression", default="none", choices=["none", "file", "message"],
+                        help="zstd compression of the synthetic bag")
+    parser.add_argument("--topics", nargs="*", help="topics to convert (default: all)")
+    parser.add_argument("--cache-ext", nargs="*", default=["feather", "csv"], help="cache formats for the warm loads")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    bag_dir = args.bag
+    if bag_dir is None:
+        tmp_dir = tempfile.mkdtemp(prefix="bag_benchmark_")
+        bag_dir = os.path.join(tmp_dir, "synthetic")
+        counts = generate_bag(bag_dir, args.duration, args.array_size, args.splits, compression=args.compression)
+        print(f"[INFO] Generated synthetic bag {bag_dir}: {counts}")
+
+    try:
+        report = run_benchmark(bag_dir, args.topics, args.cache_ext, args.repeat)
+        report["bag"]["synthetic"] = tmp_dir is not None
+        if tmp_dir is not None:
+            report["bag"].update(duration_sec=args.duration, array_size=args.array_size, splits=args.splits,
+                                 compression=args.compression)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Wrote benchmark results to {args.output}")
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,78 @@
 import os
 import sys
-import sqlite3
-import time
 import json
+import pickle
+import tempfile
+import contextlib
+import collections
+import numpy as np
 import pandas as pd
 import message_converter
+import cdr_decoder
+import topic_cache
+import conversion_stats
+import frame_cache
+from bag_reader import BagReader, connect_readonly, decompress_records
 from rclpy.serialization import deserialize_message
 from rosidl_runtime_py.utilities import get_message
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 class BagConverter:
     def __init__(self):
-        self.cursor = None
-        self.conn = None
+        self.reader = None
+        self.manifest = None
         self.bag_file_path = None
-
-    def connectDB(self, dirname):
-        bagfile_name = dirname.split("/")[-1]
-        bag_file_path = dirname + "/" + bagfile_name + "_0" + ".db3"
-        if not os.path.exists(bag_file_path):
-            print(f"Bag file not found: {bag_file_path}")
+        self.stats = None
+        # converted frames kept in memory, shared by every instance of the process; None disables it
+        self.frame_cache = frame_cache.shared_cache
+
+    def connectDB(self, dirname, build_index=False):
+        # dirname is the bag directory (or one of its .db3 splits); splits are listed by metadata.yaml when present.
+        # build_index writes a companion (topic_id, timestamp) index next to splits without one, for faster topic reads
+        reader = BagReader(dirname, build_index)
+        if not reader.files:
+            print(f"Bag file not found: {dirname}")
             return
 
-        self.bag_file_path = bag_file_path
-        self.conn = sqlite3.connect(bag_file_path)
-        self.cursor = self.conn.cursor()
+        self._closeDB()
+        self.reader = reader
+        self.manifest = topic_cache.CacheManifest(reader.bag_dir)
+        self.bag_file_path = reader.files[0].path
+
+    def enableStats(self, callback=None):
+        # record per-topic, per-stage wall time, message counts and bytes; callback gets every finished stage
+        self.stats = conversion_stats.ConversionStats(callback)
+
+    def disableStats(self):
+        self.stats = None
+
+    def getStats(self):
+        return None if self.stats is None else self.stats.toDataFrame()
+
+    def resetStats(self):
+        if self.stats is not None:
+            self.stats.reset()
+
+    def _measure(self, topic_name, stage):
+        # a no-op context when stats are disabled
+        if self.stats is None:
+            return contextlib.nullcontext({"messages": 0, "bytes": 0})
+        return self.stats.measure(topic_name, stage)
 
     def _closeDB(self):
-        if self.conn is not None:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
-
-    def __flatten_dict(self, d, parent_key='', sep='/'):
-        items = []
-        i = 0
-        for key, val in d.items():
-            new_key = f"{parent_key}{sep}{key}" if parent_key else key
-            if isinstance(val, dict):
-                items.extend(self.__flatten_dict(val, new_key, sep=sep).items())
-            elif isinstance(val, list):
-                for val_i in val:
-                    items.append((new_key + '/' + str(i), val_i))
-                    i += 1
-            else:
-                items.append((new_key, val))
-            i = 0
-        return dict(items)
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def _calcDateTime(self, timeStamps):
+        return pd.to_datetime(timeStamps, unit='ns', utc=True).tz_convert(topic_cache.local_time_zone())
 
     def _calcDataTime(self, timeStamps):
-        return "{}.{}".format(
-            time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(timeStamps / 1_000_000_000)),
-            timeStamps % 1_000_000_000,
-        )
+        # legacy row_time string: local time to the second, then the nanosecond remainder without zero padding
+        timeStamps = np.asarray(timeStamps, dtype=np.int64)
+        seconds = self._calcDateTime(timeStamps).strftime("%Y/%m/%d %H:%M:%S")
+        return np.asarray(seconds, dtype=object) + "." + (timeStamps % 1_000_000_000).astype(str).astype(object)
 
     def _calcMilliSeconds(self, timeStamps, zeroIndexTimeStamp):
         return (timeStamps - zeroIndexTimeStamp) / 1_000_000
@@ -60,121 +80,924 @@ class BagConverter:
     def _sanitize_topic_name(self, topic_name):
         return topic_name.strip("/").replace("/", "_")
 
-    def _get_topic_cache_path(self, topic_name, ext):
-        filename = self._sanitize_topic_name(topic_name) + f".{ext}"
+    def _get_topic_cache_path(self, topic_name, ext, arrays="explode"):
+        # array column mode has its own cache file next to the exploded one
+        suffix = ".arrays" if arrays == "column" else ""
+        filename = self._sanitize_topic_name(topic_name) + f"{suffix}.{ext}"
         return os.path.join(os.path.dirname(self.bag_file_path), filename)
 
-    def loadCache(self, topic_name, ext="feather"):
-        path = self._get_topic_cache_path(topic_name, ext)
+    def loadCache(self, topic_name, ext="feather", columns=None, msec_window=None, arrays="explode"):
+        if ext not in topic_cache.cache_extensions:
+            raise ValueError("Unsupported cache extension")
+
+        path = self._get_topic_cache_path(topic_name, ext, arrays)
         if not os.path.exists(path):
             return None
 
-        if ext == "feather":
-            return pd.read_feather(path)
-        elif ext == "csv":
-            return pd.read_csv(path)
-        else:
-            raise ValueError("Unsupported cache extension")
-
-    def saveCache(self, data, ext="feather"):
-        save_dir = os.path.dirname(self.bag_file_path)
+        return topic_cache.read_topic_cache(path, ext, columns, msec_window)
 
+    def saveCache(self, data, ext="feather", arrays="explode"):
         for topic_name, records in data.items():
-            filename = self._sanitize_topic_name(topic_name) + f".{ext}"
-            path = os.path.join(save_dir, filename)
-
-            if ext == "feather":
-                df = pd.DataFrame(records)
-                df.to_feather(path)
-            elif ext == "csv":
-                df = pd.DataFrame(records)
-                df.to_csv(path, index=False)
-            else:
-                raise ValueError("Unsupported cache extension")
+            path = self._get_topic_cache_path(topic_name, ext, arrays)
+            topic_cache.write_topic_cache(pd.DataFrame(records), path, ext)
+
+    def _getTopicType(self, topic_name):
+        topic = self.reader.getTopics().get(topic_name)
+        return None if topic is None else topic["type"]
+
+    def _getTopicFiles(self, topic_name, window=(None, None)):
+        # (split, topic id in that split) for every split holding the topic inside the time window
+        topicFiles = []
+        for bag_file in self.reader.getFiles(*window):
+            topicRecord = bag_file.getTopics().get(topic_name)
+            if topicRecord is not None:
+                topicFiles.append((bag_file, topicRecord[0]))
+        return topicFiles
+
+    def _decodeMessageRecords(self, topicName, decoder, messageRecords):
+        with self._measure(topicName, "decode") as stage:
+            timeStamps = np.fromiter((record[2] for record in messageRecords), dtype=np.int64, count=len(messageRecords))
+            columns = decoder.decode([record[3] for record in messageRecords])
+            stage["messages"] = len(messageRecords)
+        with self._measure(topicName, "dataframe") as stage:
+            dataFrame = cdr_decoder.apply_column_dtypes(pd.DataFrame(columns), decoder.type_name)
+            stage["messages"] = len(dataFrame)
+        return timeStamps, dataFrame
+
+    def _decompressRecords(self, topicName, messageRecords):
+        # message-mode compressed bags store every BLOB as its own zstd frame
+        with self._measure(topicName, "decompress") as stage:
+            messageRecords = decompress_records(messageRecords)
+            stage["messages"] = len(messageRecords)
+            if self.stats is not None:
+                stage["bytes"] = sum(len(record[3]) for record in messageRecords)
+        return messageRecords
+
+    def _convertMessageRecords(self, topicName, topicType, messageRecords, progress=True, arrays="explode"):
+        decoder = cdr_decoder.get_decoder(topicType, arrays)
+        if decoder is not None:
+            try:
+                return self._decodeMessageRecords(topicName, decoder, messageRecords)
+            except ValueError as e:
+                print(f"[WARN] Bulk decode failed on topic '{topicName}', falling back to per-message path: {e}")
+
+        topicTypeClassName = get_message(topicType)
+
+        deserialize = deserialize_message
+        if arrays == "column":
+            convertMessage = cdr_decoder.flatten_message_arrays
+        else:
+            convertMessage = message_converter.convert_ros_message_to_flat_dictionary
+        stageSeconds = {"deserialize": 0.0, "convert": 0.0}
+        if self.stats is not None:
+            # per-message timing only when enabled, so the disabled loop calls the plain functions
+            deserialize = self.stats.timed(deserialize, stageSeconds, "deserialize")
+            convertMessage = self.stats.timed(convertMessage, stageSeconds, "convert")
+
+        timeStampList = []
+        dataList = []
+        for _, _, timeStamps, rowDatas in tqdm(messageRecords, desc=f"  Progress [{topicName}]", unit="msg", disable=not progress):
+            try:
+                deserialized = deserialize(rowDatas, topicTypeClassName)
+                flattenDict = convertMessage(deserialized)
+
+                timeStampList.append(timeStamps)
+                dataList.append(flattenDict)
+            except Exception as e:
+                print(f"[WARN] Failed to deserialize message on topic '{topicName}': {e}")
+                continue
 
-    def _extractDataFromDB(self):
-        topicDict = {}
+        if self.stats is not None:
+            for stage, seconds in stageSeconds.items():
+                if seconds:
+                    self.stats.add(topicName, stage, seconds, len(dataList))
+        with self._measure(topicName, "dataframe") as stage:
+            dataFrame = cdr_decoder.apply_column_dtypes(pd.DataFrame(dataList), topicType)
+            stage["messages"] = len(dataFrame)
+        return np.array(timeStampList, dtype=np.int64), dataFrame
+
+    def _buildTopicFrame(self, timeStamps, dataFrame, zeroIndexTimeStamp=None, offset=0):
+        if len(timeStamps) == 0:
+            return pd.DataFrame(columns=['timestamp', 'datetime', 'msec'])
+
+        if zeroIndexTimeStamp is None:
+            zeroIndexTimeStamp = timeStamps[0]
+        timeFrame = pd.DataFrame({
+            'timestamp': timeStamps,
+            'datetime': self._calcDateTime(timeStamps),
+            'msec': self._calcMilliSeconds(timeStamps, zeroIndexTimeStamp),
+        })
+        topicFrame = pd.concat([timeFrame, dataFrame.reset_index(drop=True)], axis=1)
+        topicFrame.index = pd.RangeIndex(offset, offset + len(topicFrame))
+        return topicFrame
+
+    def _splitMessageIDRanges(self, conn, chunks):
+        firstID, lastID = conn.execute('SELECT MIN(id), MAX(id) FROM messages').fetchone()
+        if firstID is None:
+            return []
+
+        bounds = np.linspace(firstID, lastID + 1, num=chunks + 1).astype(np.int64)
+        return [(int(lo), int(hi) - 1) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+    def _getTopicStartTime(self, topicFiles):
+        for bag_file, topicID in topicFiles:
+            row = bag_file.connect().execute(
+                'SELECT timestamp FROM topic_keys WHERE topic_id = ? ORDER BY timestamp LIMIT 1', (topicID,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+        return None
+
+    def _getTopicEndTime(self, topicFiles):
+        for bag_file, topicID in reversed(topicFiles):
+            row = bag_file.connect().execute(
+                'SELECT timestamp FROM topic_keys WHERE topic_id = ? ORDER BY timestamp DESC LIMIT 1', (topicID,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+        return None
+
+    def _resolveTimeWindow(self, topicStartTime, start, end, time_unit):
+        # "msec" is relative to the topic start like the msec column, "ns" is an absolute bag timestamp
+        if time_unit == "msec":
+            toTimeStamp = lambda value: topicStartTime + int(round(value * 1_000_000))
+        elif time_unit == "ns":
+            toTimeStamp = int
+        else:
+            raise ValueError("Unsupported time unit")
+        return (
+            None if start is None else toTimeStamp(start),
+            None if end is None else toTimeStamp(end),
+        )
 
-        self.cursor.execute('SELECT id, name, type FROM topics')
-        topicRecords = self.cursor.fetchall()
+    def _messageConditions(self, topicID, window, afterID=None):
+        conditions, params = ['topic_id = ?'], [topicID]
+        if afterID is not None:
+            conditions.append('id > ?')
+            params.append(afterID)
+        if window[0] is not None:
+            conditions.append('timestamp >= ?')
+            params.append(window[0])
+        if window[1] is not None:
+            conditions.append('timestamp <= ?')
+            params.append(window[1])
+        return conditions, params
+
+    def _countTopicMessages(self, topic_name, window):
+        if window == (None, None):
+            count = self.reader.getTopics()[topic_name]["message_count"]
+            if count is not None:
+                return count
+
+        count = 0
+        for bag_file, topicID in self._getTopicFiles(topic_name, window):
+            conditions, params = self._messageConditions(topicID, window)
+            count += bag_file.connect().execute(
+                f'SELECT COUNT(*) FROM topic_keys WHERE {" AND ".join(conditions)}', params
+            ).fetchone()[0]
+        return count
+
+    def _resolveStride(self, topic_name, window, every_nth, max_points):
+        stride = every_nth or 1
+        if max_points:
+            count = self._countTopicMessages(topic_name, window)
+            stride = max(stride, -(-count // max_points))
+        return stride
+
+    def _fetchMessagePage(self, conn, conditions, params, lastKey, limit, stride, phase, table="topic_messages"):
+        if lastKey is not None:
+            # a row value comparison, so the scan seeks into the (topic_id, timestamp) or timestamp index
+            conditions = conditions + ['(timestamp, id) > (?, ?)']
+            params = params + [lastKey[0], lastKey[1]]
+        where = " AND ".join(conditions)
+
+        if stride == 1:
+            messageRecords = conn.execute(
+                f'SELECT id, topic_id, timestamp, data FROM {table} WHERE {where} ORDER BY timestamp, id LIMIT ?',
+                params + [limit]
+            ).fetchall()
+            if not messageRecords:
+                return [], None, phase
+            return messageRecords, (messageRecords[-1][2], messageRecords[-1][0]), phase
+
+        # strided page: walk the keys only, then read the BLOBs of every stride-th message by rowid.
+        # phase carries the stride position over page and split boundaries.
+        keys = conn.execute(
+            f'SELECT id, timestamp FROM topic_keys WHERE {where} ORDER BY timestamp, id LIMIT ?',
+            params + [limit * stride]
+        ).fetchall()
+        if not keys:
+            return [], None, phase
+
+        selectedIDs = [messageID for messageID, _ in keys[phase::stride]]
+        messageRecords = []
+        for i in range(0, len(selectedIDs), 500):
+            batch = selectedIDs[i:i + 500]
+            messageRecords += conn.execute(
+                f'SELECT id, topic_id, timestamp, data FROM messages WHERE id IN ({",".join("?" * len(batch))})',
+                batch
+            ).fetchall()
+        messageRecords.sort(key=lambda record: (record[2], record[0]))
+        return messageRecords, (keys[-1][1], keys[-1][0]), (phase - len(keys)) % stride
+
+    def _extractTopicParallel(self, topicName, topicType, workers, window, total=None, arrays="explode"):
+        tasks = []
+        for bag_file, topicID in self._getTopicFiles(topicName, window):
+            for firstID, lastID in self._splitMessageIDRanges(bag_file.connect(), workers * 4):
+                tasks.append((bag_file.db_path, topicID, firstID, lastID))
+        results = [None] * len(tasks)
+
+        print(f"[INFO] Decoding topic: {topicName} ({len(tasks)} chunks, {workers} workers)")
+        # workers fetch and decode in their own processes, so only the whole pool is timed
+        with self._measure(topicName, "parallel_decode") as stage, \
+                ProcessPoolExecutor(max_workers=workers) as executor, \
+                tqdm(desc=f"  Progress [{topicName}]", unit="msg", total=total) as progress:
+            futures = {
+                executor.submit(_convertTopicChunk, path, topicName, topicID, topicType, firstID, lastID, window, arrays,
+                                self.reader.message_compression): i
+                for i, (path, topicID, firstID, lastID) in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                progress.update(len(results[futures[future]][0]))
+                stage["messages"] += len(results[futures[future]][0])
+
+        results = [result for result in results if len(result[0])]
+        if not results:
+            return np.array([], dtype=np.int64), pd.DataFrame()
+
+        timeStamps = np.concatenate([result[0] for result in results])
+        # chunks disagree on categories and gaps, so the schema dtypes are applied again after the concat
+        dataFrame = cdr_decoder.apply_column_dtypes(pd.concat([result[1] for result in results], ignore_index=True), topicType)
+        if np.any(np.diff(timeStamps) < 0):
+            order = np.argsort(timeStamps, kind='stable')
+            timeStamps = timeStamps[order]
+            dataFrame = dataFrame.iloc[order].reset_index(drop=True)
+        return timeStamps, dataFrame
+
+    def iterTopicChunks(self, topic_name, chunk_size=50_000, start=None, end=None, time_unit="msec",
+                        every_nth=None, max_points=None, progress=False, row_time=False, arrays="explode"):
+        topicType = self._getTopicType(topic_name)
+        if topicType is None:
+            print(f"[ERROR] Topic '{topic_name}' not found in bag")
+            return
 
-        for topicID, topicName, topicType in topicRecords:
-            topicTypeClassName = get_message(topicType)
+        zeroIndexTimeStamp = self._getTopicStartTime(self._getTopicFiles(topic_name))
+        if zeroIndexTimeStamp is None:
+            return
 
-            self.cursor.execute(
-                'SELECT id, topic_id, timestamp, data FROM messages WHERE topic_id = ?',
-                (topicID,)
+        window = self._resolveTimeWindow(zeroIndexTimeStamp, start, end, time_unit)
+        stride = self._resolveStride(topic_name, window, every_nth, max_points)
+        for chunk in self._iterMessageChunks(topic_name, topicType, zeroIndexTimeStamp, window, stride, chunk_size,
+                                             progress, arrays=arrays):
+            yield self.addRowTime(chunk) if row_time else chunk
+
+    def _iterMessageChunks(self, topic_name, topicType, zeroIndexTimeStamp, window, stride, chunk_size,
+                           progress=False, afterIDs=None, arrays="explode"):
+        # afterIDs maps split paths to the rowid after which to resume; other splits are skipped
+        offset = 0
+        phase = 0
+        for bag_file, topicID in self._getTopicFiles(topic_name, window):
+            if afterIDs is not None and bag_file.path not in afterIDs:
+                continue
+            conditions, params = self._messageConditions(
+                topicID, window, None if afterIDs is None else afterIDs[bag_file.path]
             )
-            messageRecords = self.cursor.fetchall()
-            if not messageRecords:
+            lastKey = None
+            while True:
+                # keyset pagination: each page is a short indexed query, so no cursor stays open between chunks.
+                # connect() per page drops a companion index as soon as the split grows
+                with self._measure(topic_name, "fetch") as stage:
+                    messageRecords, lastKey, phase = self._fetchMessagePage(
+                        bag_file.connect(), conditions, params, lastKey, chunk_size, stride, phase
+                    )
+                    if self.stats is not None:
+                        stage["messages"] = len(messageRecords)
+                        stage["bytes"] = sum(len(record[3]) for record in messageRecords)
+                if messageRecords and self.reader.message_compression:
+                    messageRecords = self._decompressRecords(topic_name, messageRecords)
+                if messageRecords:
+                    timeStamps, dataFrame = self._convertMessageRecords(
+                        topic_name, topicType, messageRecords, progress=progress, arrays=arrays
+                    )
+                    del messageRecords
+                    with self._measure(topic_name, "dataframe"):
+                        chunk = self._buildTopicFrame(timeStamps, dataFrame, zeroIndexTimeStamp, offset)
+                    offset += len(chunk)
+                    yield chunk
+                if lastKey is None:
+                    break
+
+    def iterTopicsChunks(self, topic_names, chunk_size=50_000, arrays="explode", progress=None):
+        """
+        Reads several topics in one timestamp-ordered scan of every split instead
+        of one query per topic. Yields {topic name: chunk} for every page of
+        chunk_size messages; topics without messages in a page are left out.
+        msec is relative to each topic's start like in iterTopicChunks.
+        """
+        topicTypes = {}
+        for topic_name in dict.fromkeys(topic_names):
+            topicTypes[topic_name] = self._getTopicType(topic_name)
+            if topicTypes[topic_name] is None:
+                print(f"[ERROR] Topic '{topic_name}' not found in bag")
+                return
+        zeroIndexTimeStamps = {
+            topic_name: self._getTopicStartTime(self._getTopicFiles(topic_name)) for topic_name in topicTypes
+        }
+        offsets = dict.fromkeys(topicTypes, 0)
+        label = ",".join(topicTypes)
+
+        for bag_file in self.reader.files:
+            topicNames = {topicID: name for name, (topicID, _) in bag_file.getTopics().items() if name in topicTypes}
+            if not topicNames:
                 continue
+            conn = bag_file.connect()
+            conditions, params = [f'topic_id IN ({",".join("?" * len(topicNames))})'], list(topicNames)
+            lastKey = None
+            while True:
+                # the bag's timestamp index keeps the pages ordered across topics, so messages is read only once
+                with self._measure(label, "fetch") as stage:
+                    messageRecords, lastKey, _ = self._fetchMessagePage(
+                        conn, conditions, params, lastKey, chunk_size, 1, 0, table="messages"
+                    )
+                    if self.stats is not None:
+                        stage["messages"] = len(messageRecords)
+                        stage["bytes"] = sum(len(record[3]) for record in messageRecords)
+                if messageRecords and self.reader.message_compression:
+                    messageRecords = self._decompressRecords(label, messageRecords)
+
+                topicRecords = {}
+                for record in messageRecords:
+                    topicRecords.setdefault(record[1], []).append(record)
+                del messageRecords
+                chunks = {}
+                for topicID, records in topicRecords.items():
+                    topic_name = topicNames[topicID]
+                    timeStamps, dataFrame = self._convertMessageRecords(
+                        topic_name, topicTypes[topic_name], records, progress=False, arrays=arrays
+                    )
+                    with self._measure(topic_name, "dataframe"):
+                        chunk = self._buildTopicFrame(
+                            timeStamps, dataFrame, zeroIndexTimeStamps[topic_name], offsets[topic_name]
+                        )
+                    offsets[topic_name] += len(chunk)
+                    if progress is not None:
+                        progress.update(len(records))
+                    if len(chunk):
+                        chunks[topic_name] = chunk
+                if chunks:
+                    yield chunks
+                if lastKey is None:
+                    break
+
+    def _extractTopicsFromDB(self, topic_names, chunk_size=50_000, arrays="explode"):
+        # whole topics from one scan; None when a topic is not in the bag
+        if any(self._getTopicType(topic_name) is None for topic_name in topic_names):
+            return None
+        counts = [self.reader.getTopics()[topic_name]["message_count"] for topic_name in topic_names]
+        total = None if None in counts else sum(counts)
+        chunks = {topic_name: [] for topic_name in topic_names}
+        print(f"[INFO] Decoding topics: {', '.join(topic_names)}")
+        with tqdm(desc="  Progress [topics]", unit="msg", total=total) as progress:
+            for page in self.iterTopicsChunks(topic_names, chunk_size, arrays, progress):
+                for topic_name, chunk in page.items():
+                    chunks[topic_name].append(chunk)
+
+        return {topic_name: self._concatTopicChunks(topic_name, topicChunks) for topic_name, topicChunks in chunks.items()}
+
+    def _iterTopicsFromDB(self, topic_names, chunk_size=50_000, arrays="explode"):
+        # (topic name, whole frame) one topic at a time from one scan: the chunks wait in temporary spill files
+        # (TMPDIR) instead of memory, so only one topic is held at once
+        if any(self._getTopicType(topic_name) is None for topic_name in topic_names):
+            raise KeyError(f"Topics not found in bag: {topic_names}")
+        counts = [self.reader.getTopics()[topic_name]["message_count"] for topic_name in topic_names]
+        total = None if None in counts else sum(counts)
+        with tempfile.TemporaryDirectory(prefix="bag_converter_") as spillDir:
+            spillPaths = {topic_name: os.path.join(spillDir, f"{i}.pickle") for i, topic_name in enumerate(topic_names)}
+            print(f"[INFO] Decoding topics: {', '.join(topic_names)}")
+            with tqdm(desc="  Progress [topics]", unit="msg", total=total) as progress:
+                for page in self.iterTopicsChunks(topic_names, chunk_size, arrays, progress):
+                    for topic_name, chunk in page.items():
+                        with open(spillPaths[topic_name], "ab") as f:
+                            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            for topic_name, spillPath in spillPaths.items():
+                topicChunks = []
+                if os.path.exists(spillPath):
+                    with open(spillPath, "rb") as f:
+                        while True:
+                            try:
+                                topicChunks.append(pickle.load(f))
+                            except EOFError:
+                                break
+                    os.remove(spillPath)
+                df = self._concatTopicChunks(topic_name, topicChunks)
+                del topicChunks
+                yield topic_name, df
+                del df
+
+    def _concatTopicChunks(self, topic_name, topicChunks):
+        if not topicChunks:
+            return self._buildTopicFrame(np.array([], dtype=np.int64), pd.DataFrame())
+        with self._measure(topic_name, "dataframe"):
+            return cdr_decoder.apply_column_dtypes(pd.concat(topicChunks), self._getTopicType(topic_name))
+
+    def _extractTopicFromDB(self, topic_name, workers=None, chunk_size=50_000, start=None, end=None,
+                            time_unit="msec", every_nth=None, max_points=None, arrays="explode"):
+        topicType = self._getTopicType(topic_name)
+        if topicType is None:
+            return None
+
+        filtered = any(value is not None for value in (start, end, every_nth, max_points))
+        total = None if filtered else self.reader.getTopics()[topic_name]["message_count"]
+
+        # strided reads stay serial: the stride is counted over the whole topic, not per worker chunk
+        if workers is not None and workers > 1 and not every_nth and not max_points:
+            zeroIndexTimeStamp = self._getTopicStartTime(self._getTopicFiles(topic_name))
+            if zeroIndexTimeStamp is None:
+                return self._buildTopicFrame(np.array([], dtype=np.int64), pd.DataFrame())
+            window = self._resolveTimeWindow(zeroIndexTimeStamp, start, end, time_unit)
+            timeStamps, dataFrame = self._extractTopicParallel(topic_name, topicType, workers, window, total, arrays)
+            with self._measure(topic_name, "dataframe"):
+                return self._buildTopicFrame(timeStamps, dataFrame, zeroIndexTimeStamp)
+
+        print(f"[INFO] Decoding topic: {topic_name}")
+        chunks = []
+        with tqdm(desc=f"  Progress [{topic_name}]", unit="msg", total=total) as progress:
+            for chunk in self.iterTopicChunks(topic_name, chunk_size, start, end, time_unit, every_nth, max_points,
+                                              arrays=arrays):
+                chunks.append(chunk)
+                progress.update(len(chunk))
+
+        if not chunks:
+            return self._buildTopicFrame(np.array([], dtype=np.int64), pd.DataFrame())
+        with self._measure(topic_name, "dataframe"):
+            return cdr_decoder.apply_column_dtypes(pd.concat(chunks), topicType)
+
+    def _getSplitState(self, bag_file, topic_name):
+        stat = os.stat(bag_file.path)
+        state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "max_id": 0, "max_timestamp": None, "message_count": 0}
+        topicRecord = bag_file.getTopics().get(topic_name)
+        if topicRecord is not None:
+            # the bag itself, never a companion index that may lag behind a growing split
+            maxID, maxTimeStamp, count = bag_file.connect().execute(
+                'SELECT MAX(id), MAX(timestamp), COUNT(*) FROM main.messages WHERE topic_id = ?', (topicRecord[0],)
+            ).fetchone()
+            state.update(max_id=maxID or 0, max_timestamp=maxTimeStamp, message_count=count)
+        return state
+
+    def _recordCache(self, topic_name, ext, df, arrays="explode"):
+        topicFiles = self._getTopicFiles(topic_name)
+        self.manifest.setEntry(os.path.basename(self._get_topic_cache_path(topic_name, ext, arrays)), {
+            "topic": topic_name,
+            "converter_version": topic_cache.CACHE_VERSION,
+            "zero_timestamp": self._getTopicStartTime(topicFiles),
+            "rows": len(df),
+            "splits": {os.path.basename(bag_file.path): self._getSplitState(bag_file, topic_name) for bag_file in self.reader.files},
+        })
+
+    def _checkCache(self, topic_name, ext, arrays="explode"):
+        # returns ("fresh" | "append" | "stale", afterIDs); afterIDs maps grown or new splits to their high-water rowid
+        path = self._get_topic_cache_path(topic_name, ext, arrays)
+        entry = self.manifest.getEntry(os.path.basename(path))
+        if entry is None or entry.get("converter_version") != topic_cache.CACHE_VERSION or entry.get("zero_timestamp") is None:
+            return "stale", None
+
+        currentSplits = {os.path.basename(bag_file.path): bag_file for bag_file in self.reader.files}
+        if any(split not in currentSplits for split in entry["splits"]):
+            return "stale", None
+
+        afterIDs = {}
+        for split, bag_file in currentSplits.items():
+            recorded = entry["splits"].get(split)
+            stat = os.stat(bag_file.path)
+            if recorded is None:
+                afterIDs[bag_file.path] = 0
+                continue
+            if recorded["size"] == stat.st_size and recorded["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            if stat.st_size < recorded["size"]:
+                return "stale", None
+
+            # the split changed: it only grew if every converted row is still there unchanged
+            topicRecord = bag_file.getTopics().get(topic_name)
+            if recorded["message_count"]:
+                if topicRecord is None:
+                    return "stale", None
+                conn = bag_file.connect()
+                row = conn.execute(
+                    'SELECT timestamp FROM main.messages WHERE id = ? AND topic_id = ?', (recorded["max_id"], topicRecord[0])
+                ).fetchone()
+                count, = conn.execute(
+                    'SELECT COUNT(*) FROM main.messages WHERE topic_id = ? AND id <= ?', (topicRecord[0], recorded["max_id"])
+                ).fetchone()
+                if row is None or row[0] != recorded["max_timestamp"] or count != recorded["message_count"]:
+                    return "stale", None
+            afterIDs[bag_file.path] = recorded["max_id"]
+
+        # appending to a file the entry does not describe would duplicate or lose rows
+        if afterIDs and topic_cache.count_topic_cache_rows(path, ext) != entry["rows"]:
+            return "stale", None
+        return ("append" if afterIDs else "fresh"), afterIDs
+
+    def _appendCache(self, topic_name, ext, afterIDs, chunk_size=50_000, arrays="explode"):
+        path = self._get_topic_cache_path(topic_name, ext, arrays)
+        entry = self.manifest.getEntry(os.path.basename(path))
+        chunks = list(self._iterMessageChunks(
+            topic_name, self._getTopicType(topic_name), entry["zero_timestamp"], (None, None), 1, chunk_size,
+            afterIDs=afterIDs, arrays=arrays
+        ))
+        newRows = sum(len(chunk) for chunk in chunks)
+        if newRows:
+            with self._measure(topic_name, "cache_read") as stage:
+                df = topic_cache.read_topic_cache(path, ext)
+                stage["messages"] = len(df)
+            df = cdr_decoder.apply_column_dtypes(pd.concat([df] + chunks, ignore_index=True), self._getTopicType(topic_name))
+            with self._measure(topic_name, "cache_write") as stage:
+                topic_cache.write_topic_cache(df, path, ext)
+                stage["messages"] = len(df)
+                stage["bytes"] = os.path.getsize(path)
+        else:
+            df = None
+
+        entry["rows"] += newRows
+        for bag_file in self.reader.files:
+            split = os.path.basename(bag_file.path)
+            if bag_file.path in afterIDs or split not in entry["splits"]:
+                entry["splits"][split] = self._getSplitState(bag_file, topic_name)
+        self.manifest.setEntry(os.path.basename(path), entry)
+        print(f"[INFO] Appended {newRows} new messages to cache for topic '{topic_name}'")
+
+    def _resolveCacheWindow(self, zeroIndexTimeStamp, start, end, time_unit):
+        # caches store msec relative to the topic start recorded in the manifest, so absolute ns windows are shifted
+        # by it; querying the bag for it would decompress every compressed split
+        if start is None and end is None:
+            return None
+        if time_unit == "ns":
+            start = None if start is None else self._calcMilliSeconds(start, zeroIndexTimeStamp)
+            end = None if end is None else self._calcMilliSeconds(end, zeroIndexTimeStamp)
+        elif time_unit != "msec":
+            raise ValueError("Unsupported time unit")
+        return (start, end)
+
+    def _frameCacheKey(self, topic_name, arrays, selection=None):
+        # selection None is the whole topic; the splits' size and mtime make a grown or re-recorded bag miss
+        splits = []
+        for bag_file in self.reader.files:
+            stat = os.stat(bag_file.path)
+            splits.append((bag_file.path, stat.st_size, stat.st_mtime_ns))
+        return (os.path.abspath(self.reader.bag_dir), tuple(splits), topic_name, arrays, selection, topic_cache.CACHE_VERSION)
+
+    def _selectCachedFrame(self, df, start, end, time_unit, every_nth, max_points, columns, row_time):
+        # the selection a cache file read applies, on a whole topic frame already in memory;
+        # an absolute ns window is cut on the frame's own timestamps, like the bag query does
+        if start is not None or end is not None:
+            if time_unit not in ("msec", "ns"):
+                raise ValueError("Unsupported time unit")
+            windowColumn = 'timestamp' if time_unit == "ns" else 'msec'
+            mask = np.ones(len(df), dtype=bool)
+            if start is not None:
+                mask &= (df[windowColumn] >= start).to_numpy()
+            if end is not None:
+                mask &= (df[windowColumn] <= end).to_numpy()
+            df = df[mask].reset_index(drop=True)
+        return self._selectColumns(self._strideFrame(df, every_nth, max_points), columns, row_time)
+
+    def addRowTime(self, df):
+        # the legacy "row_time" string column, computed on demand from the timestamp column
+        df = df.copy()
+        df.insert(0, 'row_time', self._calcDataTime(df['timestamp'].to_numpy()) if len(df) else pd.Series(dtype=object))
+        return df
 
-            zeroIndexTimeStamp = messageRecords[0][2]
-
-            dataList = []
-            print(f"[INFO] Deserializing topic: {topicName} ({len(messageRecords)} messages)")
-            for _, _, timeStamps, rowDatas in tqdm(messageRecords, desc=f"  Progress [{topicName}]", unit="msg"):
-                try:
-                    deserialized = deserialize_message(rowDatas, topicTypeClassName)
-                    rowDataDic = message_converter.convert_ros_message_to_dictionary(deserialized)
-                    flattenDict = self.__flatten_dict(rowDataDic)
-
-                    _tmpDict = {
-                        'row_time': self._calcDataTime(timeStamps),
-                        'msec': self._calcMilliSeconds(timeStamps, zeroIndexTimeStamp),
-                    }
-                    _tmpDict.update(flattenDict)
-                    dataList.append(_tmpDict)
-                except Exception as e:
-                    print(f"[WARN] Failed to deserialize message on topic '{topicName}': {e}")
+    def _selectColumns(self, df, columns, row_time):
+        if row_time:
+            df = self.addRowTime(df)
+        if columns is not None:
+            df = df[(['row_time'] if row_time else []) + list(columns)]
+        return df
+
+    def _strideFrame(self, df, every_nth, max_points):
+        stride = every_nth or 1
+        if max_points:
+            stride = max(stride, -(-len(df) // max_points))
+        if stride == 1:
+            return df
+        return df.iloc[::stride].reset_index(drop=True)
+
+    def _alignTopicChunk(self, timeStamps, buffer, prefix, tolerance, method):
+        right = buffer.drop(columns=['datetime', 'msec']).rename(
+            columns=lambda column: column if column == 'timestamp' else f"{prefix}/{column}"
+        )
+        if method != "interp":
+            merged = pd.merge_asof(
+                pd.DataFrame({'timestamp': timeStamps}), right, on='timestamp',
+                direction="backward" if method == "ffill" else "nearest", tolerance=tolerance
+            )
+            return merged.drop(columns=['timestamp'])
+
+        # linear interpolation between the samples before and after each timestamp; non-numeric columns take the previous sample
+        sampleTimes = right['timestamp'].to_numpy()
+        after = np.searchsorted(sampleTimes, timeStamps, side='right')
+        before = after - 1
+        valid = (before >= 0) & (after < len(sampleTimes))
+        exact = (before >= 0) & (sampleTimes[np.clip(before, 0, None)] == timeStamps)
+        before, after = np.clip(before, 0, len(sampleTimes) - 1), np.clip(after, 0, len(sampleTimes) - 1)
+        if tolerance is not None:
+            valid &= (timeStamps - sampleTimes[before] <= tolerance) & (sampleTimes[after] - timeStamps <= tolerance)
+        valid |= exact
+        span = sampleTimes[after] - sampleTimes[before]
+        weight = np.where(valid & ~exact & (span > 0), (timeStamps - sampleTimes[before]) / np.where(span > 0, span, 1), 0.0)
+
+        aligned = {}
+        for column in right.columns.drop('timestamp'):
+            values = right[column]
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+                aligned[column] = np.where(valid, values[before] + weight * (values[after] - values[before]), np.nan)
+            else:
+                aligned[column] = values.iloc[before].where(valid).reset_index(drop=True)
+        return pd.DataFrame(aligned)
+
+    def iterAlignedTopics(self, topic_names, on=None, tolerance=None, method="nearest", chunk_size=50_000):
+        on = on or topic_names[0]
+        if method not in ("nearest", "ffill", "interp"):
+            raise ValueError("Unsupported align method")
+        for topic_name in set(topic_names) | {on}:
+            if self._getTopicType(topic_name) is None:
+                print(f"[ERROR] Topic '{topic_name}' not found in bag")
+                return
+
+        # tolerance is in msec like the msec column; all topics share the bag start as msec zero
+        zeroIndexTimeStamp = self.reader.getStartTime()
+        tolerance = None if tolerance is None else int(round(tolerance * 1_000_000))
+        others = [topic_name for topic_name in dict.fromkeys(topic_names) if topic_name != on]
+        buffers = {topic_name: None for topic_name in others}
+
+        # all topics come from one ordered scan; chunks are queued per topic until the alignment asks for them.
+        # a topic that reached its last timestamp stops the read-ahead, so the other topics are not queued in full
+        pages = self.iterTopicsChunks([on] + others, chunk_size)
+        queued = {topic_name: collections.deque() for topic_name in [on] + others}
+        endTimeStamps = {topic_name: self._getTopicEndTime(self._getTopicFiles(topic_name)) for topic_name in queued}
+        queuedTimeStamps = dict.fromkeys(queued)
+
+        def nextChunk(topic_name):
+            while not queued[topic_name]:
+                if endTimeStamps[topic_name] is None or (queuedTimeStamps[topic_name] is not None and
+                                                         queuedTimeStamps[topic_name] >= endTimeStamps[topic_name]):
+                    return None
+                page = next(pages, None)
+                if page is None:
+                    return None
+                for name, chunk in page.items():
+                    queued[name].append(chunk)
+                    queuedTimeStamps[name] = chunk['timestamp'].iloc[-1]
+            return queued[topic_name].popleft()
+
+        while (chunk := nextChunk(on)) is not None:
+            timeStamps = chunk['timestamp'].to_numpy()
+            lastTimeStamp = timeStamps[-1]
+            frames = [
+                pd.DataFrame({
+                    'timestamp': timeStamps,
+                    'datetime': chunk['datetime'].to_numpy(),
+                    'msec': self._calcMilliSeconds(timeStamps, zeroIndexTimeStamp),
+                }),
+                chunk.drop(columns=['timestamp', 'datetime', 'msec'])
+                     .rename(columns=lambda column: f"{on}/{column}").reset_index(drop=True),
+            ]
+
+            for topic_name in others:
+                # read ahead until one sample lies past this chunk, so backward and forward neighbours are both known
+                buffer = buffers[topic_name]
+                while buffer is None or buffer['timestamp'].iloc[-1] <= lastTimeStamp:
+                    otherChunk = nextChunk(topic_name)
+                    if otherChunk is None:
+                        break
+                    buffer = otherChunk if buffer is None else pd.concat([buffer, otherChunk], ignore_index=True)
+                if buffer is None:
                     continue
 
-            topicDict[str(topicName)] = dataList
+                frames.append(self._alignTopicChunk(timeStamps, buffer, topic_name, tolerance, method))
+                # keep only the last sample at or before this chunk and the samples after it
+                keepFrom = max(int(np.searchsorted(buffer['timestamp'].to_numpy(), lastTimeStamp, side='right')) - 1, 0)
+                buffers[topic_name] = buffer.iloc[keepFrom:].reset_index(drop=True)
+
+            yield pd.concat(frames, axis=1)
+
+    def getAlignedTopics(self, topic_names, on=None, tolerance=None, method="nearest", chunk_size=50_000):
+        # one row per message of the "on" topic with the other topics' columns as-of merged onto it
+        chunks = list(self.iterAlignedTopics(topic_names, on, tolerance, method, chunk_size))
+        if not chunks:
+            return pd.DataFrame(columns=['timestamp', 'datetime', 'msec'])
+        df = pd.concat(chunks, ignore_index=True)
+        # chunks with different categories concatenate to object columns
+        for column, dtype in chunks[0].dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        return df
 
-        return topicDict
+    def describe(self, arrays="explode"):
+        """
+        Returns one row per topic: type, message_count, first/last timestamp [ns],
+        duration_sec, rate_hz and schema, the flattened column -> dtype schema.
+
+        Counts come from metadata.yaml (SQL COUNT without it), first/last
+        timestamps from the timestamp index and the schema from the message
+        definition, so no payload is read. Sequences exploded into a variable
+        number of columns are listed once as "key/*".
+        While .db3.zstd splits are not decompressed yet, first/last timestamps,
+        duration_sec and rate_hz are left unknown rather than decompressing them.
+        """
+        timeStampsKnown = all(bag_file.decompressed for bag_file in self.reader.files)
+        rows = []
+        for topic_name, topic in self.reader.getTopics().items():
+            count = self._countTopicMessages(topic_name, (None, None))
+            firstTimeStamp = lastTimeStamp = None
+            if count and timeStampsKnown:
+                topicFiles = self._getTopicFiles(topic_name)
+                firstTimeStamp = self._getTopicStartTime(topicFiles)
+                lastTimeStamp = self._getTopicEndTime(topicFiles)
+            duration = None if firstTimeStamp is None else (lastTimeStamp - firstTimeStamp) / 1_000_000_000
+            try:
+                schema = cdr_decoder.get_column_schema(topic["type"], arrays)
+            except (AttributeError, ModuleNotFoundError, ValueError) as e:
+                print(f"[WARN] No message definition for topic '{topic_name}' ({topic['type']}): {e}")
+                schema = None
+            rows.append({
+                "topic": topic_name,
+                "type": topic["type"],
+                "message_count": count,
+                "first_timestamp": firstTimeStamp,
+                "last_timestamp": lastTimeStamp,
+                "duration_sec": duration,
+                "rate_hz": (count - 1) / duration if duration else None,
+                "schema": schema,
+            })
+
+        df = pd.DataFrame(rows, columns=["topic", "type", "message_count", "first_timestamp", "last_timestamp",
+                                         "duration_sec", "rate_hz", "schema"])
+        return df.astype({"first_timestamp": "Int64", "last_timestamp": "Int64", "duration_sec": "float64",
+                          "rate_hz": "float64"})
 
     def getAllTopicNameAndMessageType(self):
-        self.cursor.execute('SELECT name, id, type FROM topics')
-        records = self.cursor.fetchall()
-        if not records:
+        summary = self.describe()
+        if len(summary) == 0:
             print("No topics found")
             return
 
-        for topic_name, topicID, topicType in records:
-            topicTypeClassName = get_message(topicType)
-            self.cursor.execute('SELECT data FROM messages WHERE topic_id = ? LIMIT 1', (topicID,))
-            row = self.cursor.fetchone()
-            if not row:
-                print(f"{topic_name}: No message data found")
+        for topic in summary.itertuples(index=False):
+            if not topic.message_count:
+                print(f"{topic.topic}: No message data found")
                 continue
 
-            rowDatas = row[0]
-            deserialized = deserialize_message(rowDatas, topicTypeClassName)
-            rowDataDic = message_converter.convert_ros_message_to_dictionary(deserialized)
-            flattenDict = self.__flatten_dict(rowDataDic)
+            print(f"{topic.topic}: {topic.type}")
+            for key, dtype in (topic.schema or {}).items():
+                print(f"  - {key} ({dtype})")
 
-            print(f"{topic_name}:")
-            for key in flattenDict.keys():
-                print(f"  - {key}")
-
-    def getTopicDataWithPandas(self, topic_name, use_cache=True, cache_ext="feather"):
+    def getTopicDataWithPandas(self, topic_name, use_cache=True, cache_ext="feather", workers=None, chunk_size=50_000,
+                               start=None, end=None, time_unit="msec", every_nth=None, max_points=None, columns=None,
+                               row_time=False, arrays="explode"):
+        # arrays="column" keeps every primitive array field as one column of ndarrays (uint8/char arrays as bytes)
+        # instead of exploding it into field/0, field/1, ... columns
         if self.bag_file_path is None:
             print("Please connect to bag DB first via connectDB()")
             return None
-
-        if use_cache:
-            cached_df = self.loadCache(topic_name, cache_ext)
-            if cached_df is not None:
-                print(f"[INFO] Loaded cache for topic '{topic_name}' from {self._get_topic_cache_path(topic_name, cache_ext)}")
-                return cached_df
-
-        topicDict = self._extractDataFromDB()
-        self._closeDB()
-
-        if topic_name not in topicDict:
+        if arrays not in ("explode", "column"):
+            raise ValueError("Unsupported arrays mode")
+
+        # a repeated call is served from memory: the exact selection, or cut out of the whole topic frame
+        filtered = any(value is not None for value in (start, end, every_nth, max_points))
+        memoryKeys = None
+        if use_cache and self.frame_cache is not None:
+            selection = None
+            if filtered or columns is not None or row_time:
+                selection = (start, end, time_unit, every_nth, max_points, None if columns is None else tuple(columns), row_time)
+            memoryKeys = (self._frameCacheKey(topic_name, arrays, selection), self._frameCacheKey(topic_name, arrays))
+            with self._measure(topic_name, "memory_cache") as stage:
+                df = self.frame_cache.get(memoryKeys[0])
+                if df is None and memoryKeys[0] != memoryKeys[1]:
+                    topic_df = self.frame_cache.get(memoryKeys[1])
+                    if topic_df is not None:
+                        df = self._selectCachedFrame(topic_df, start, end, time_unit, every_nth, max_points,
+                                                     columns, row_time)
+                stage["messages"] = 0 if df is None else len(df)
+            if df is not None:
+                print(f"[INFO] Loaded topic '{topic_name}' from memory cache")
+                return df
+
+        cacheable = not (arrays == "column" and cache_ext == "csv")
+        if not cacheable:
+            print("[WARN] Array columns cannot be cached as csv, converting without cache")
+            use_cache = False
+
+        cachePath = self._get_topic_cache_path(topic_name, cache_ext, arrays)
+        if use_cache and os.path.exists(cachePath):
+            cacheState, afterIDs = self._checkCache(topic_name, cache_ext, arrays)
+            if cacheState == "append":
+                self._appendCache(topic_name, cache_ext, afterIDs, chunk_size, arrays)
+            if cacheState != "stale":
+                zeroIndexTimeStamp = self.manifest.getEntry(os.path.basename(cachePath))["zero_timestamp"]
+                msecWindow = self._resolveCacheWindow(zeroIndexTimeStamp, start, end, time_unit)
+                readColumns = columns
+                if columns is not None and row_time and 'timestamp' not in columns:
+                    readColumns = list(columns) + ['timestamp']
+                with self._measure(topic_name, "cache_read") as stage:
+                    cached_df = self.loadCache(topic_name, cache_ext, readColumns, msecWindow, arrays)
+                    if cache_ext == "csv":
+                        # csv keeps no dtypes, so they are restored from the message definition
+                        cached_df = cdr_decoder.apply_column_dtypes(cached_df, self._getTopicType(topic_name))
+                    stage["messages"] = len(cached_df)
+                print(f"[INFO] Loaded cache for topic '{topic_name}' from {cachePath}")
+                df = self._selectColumns(self._strideFrame(cached_df, every_nth, max_points), columns, row_time)
+                if memoryKeys is not None:
+                    if readColumns is None and msecWindow is None:
+                        self.frame_cache.put(memoryKeys[1], cached_df)
+                    else:
+                        self.frame_cache.put(memoryKeys[0], df)
+                return df
+            print(f"[INFO] Cache for topic '{topic_name}' is out of date, converting again")
+
+        df = self._extractTopicFromDB(topic_name, workers, chunk_size, start, end, time_unit, every_nth, max_points, arrays)
+        if df is None:
             print(f"[ERROR] Topic '{topic_name}' not found in bag")
             sys.exit(1)
 
-        self.saveCache(topicDict, cache_ext)
-        df = pd.DataFrame(topicDict[topic_name])
-        return df
+        # a filtered read is only part of the topic, so it must not overwrite the topic cache
+        if not filtered and cacheable:
+            with self._measure(topic_name, "cache_write") as stage:
+                self.saveCache({topic_name: df}, cache_ext, arrays)
+                self._recordCache(topic_name, cache_ext, df, arrays)
+                stage["messages"] = len(df)
+                stage["bytes"] = os.path.getsize(cachePath)
+        if memoryKeys is not None:
+            if filtered:
+                self.frame_cache.put(memoryKeys[0], self._selectColumns(df, columns, row_time))
+            else:
+                self.frame_cache.put(memoryKeys[1], df)
+        return self._selectColumns(df, columns, row_time)
+
+    def getTopicsDataWithPandas(self, topic_names=None, use_cache=True, cache_ext="feather", chunk_size=50_000,
+                                arrays="explode"):
+        """
+        Returns {topic name: DataFrame} like getTopicDataWithPandas for several
+        topics (default: all). Topics in the memory cache or with a usable cache
+        file are loaded from there; the others are converted together in one
+        scan of the bag and then cached.
+        """
+        if self.bag_file_path is None:
+            print("Please connect to bag DB first via connectDB()")
+            return None
+        topic_names = list(dict.fromkeys(topic_names or self.reader.getTopics()))
+        cacheable = not (arrays == "column" and cache_ext == "csv")
+
+        frames = {}
+        if use_cache:
+            for topic_name in topic_names:
+                inMemory = self.frame_cache is not None and self._frameCacheKey(topic_name, arrays) in self.frame_cache
+                if inMemory or (cacheable and os.path.exists(self._get_topic_cache_path(topic_name, cache_ext, arrays))
+                                and self._checkCache(topic_name, cache_ext, arrays)[0] != "stale"):
+                    frames[topic_name] = self.getTopicDataWithPandas(topic_name, cache_ext=cache_ext, arrays=arrays)
+
+        pending = [topic_name for topic_name in topic_names if topic_name not in frames]
+        if pending:
+            converted = self._extractTopicsFromDB(pending, chunk_size, arrays)
+            if converted is None:
+                print(f"[ERROR] Topic not found in bag: {[name for name in pending if self._getTopicType(name) is None]}")
+                sys.exit(1)
+            for topic_name, df in converted.items():
+                if cacheable:
+                    with self._measure(topic_name, "cache_write") as stage:
+                        self.saveCache({topic_name: df}, cache_ext, arrays)
+                        self._recordCache(topic_name, cache_ext, df, arrays)
+                        stage["messages"] = len(df)
+                if use_cache and self.frame_cache is not None:
+                    self.frame_cache.put(self._frameCacheKey(topic_name, arrays), df)
+                frames[topic_name] = df
+        return {topic_name: frames[topic_name] for topic_name in topic_names}
+
+
+def _convertTopicChunk(bag_file_path, topicName, topicID, topicType, firstID, lastID, window, arrays="explode",
+                      compression=None):
+    conditions = ['topic_id = ?', 'id BETWEEN ? AND ?']
+    params = [topicID, firstID, lastID]
+    if window[0] is not None:
+        conditions.append('timestamp >= ?')
+        params.append(window[0])
+    if window[1] is not None:
+        conditions.append('timestamp <= ?')
+        params.append(window[1])
+
+    conn = connect_readonly(bag_file_path)
+    try:
+        messageRecords = conn.execute(
+            f'SELECT id, topic_id, timestamp, data FROM messages WHERE {" AND ".join(conditions)} ORDER BY timestamp, id',
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    if not messageRecords:
+        return np.array([], dtype=np.int64), pd.DataFrame()
+    if compression:
+        messageRecords = decompress_records(messageRecords)
+    return BagConverter()._convertMessageRecords(topicName, topicType, messageRecords, progress=False, arrays=arrays)
@@ -0,0 +1,369 @@
+import os
+import re
+import glob
+import sqlite3
+import weakref
+import tempfile
+import urllib.parse
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    # only needed for compressed bags
+    zstandard = None
+
+# read-only connection tuning: memory-mapped reads, a 64 MiB page cache and in-memory temp b-trees
+SQLITE_MMAP_SIZE = 1 << 30
+SQLITE_CACHE_KIB = 64 * 1024
+
+TOPIC_INDEX_SUFFIX = ".topic_index"
+TOPIC_INDEX_VERSION = 1
+
+DECOMPRESS_THREADS = min(8, os.cpu_count() or 1)
+# smaller batches are decompressed on the calling thread
+DECOMPRESS_BATCH = 1024
+
+
+def _splitIndex(path):
+    match = re.search(r"_(\d+)\.db3(\.zstd)?$", path)
+    return int(match.group(1)) if match else 0
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("Reading zstd compressed bags requires the zstandard package (pip install zstandard)")
+
+
+def decompress_file(path):
+    """
+    Streams a file-mode compressed split (.db3.zstd) into a temporary .db3
+    file and returns its path. TMPDIR chooses where it is written.
+    """
+    _require_zstandard()
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".db3")
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            zstandard.ZstdDecompressor().copy_stream(src, dst)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _decompress_batch(blobs):
+    # decompressors are not thread-safe, so every batch has its own
+    decompressor = zstandard.ZstdDecompressor()
+    return [decompressor.decompress(blob) for blob in blobs]
+
+
+def decompress_messages(blobs, threads=DECOMPRESS_THREADS):
+    """
+    Decompresses message-mode compressed BLOBs, in contiguous batches across
+    threads (zstd releases the GIL) when there are enough of them.
+    """
+    _require_zstandard()
+    if threads <= 1 or len(blobs) < 2 * DECOMPRESS_BATCH:
+        return _decompress_batch(blobs)
+    size = max(DECOMPRESS_BATCH, -(-len(blobs) // threads))
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        batches = executor.map(_decompress_batch, [blobs[i:i + size] for i in range(0, len(blobs), size)])
+        return [data for batch in batches for data in batch]
+
+
+def decompress_records(messageRecords, threads=DECOMPRESS_THREADS):
+    # (id, topic_id, timestamp, data) rows with the data decompressed
+    datas = decompress_messages([record[3] for record in messageRecords], threads)
+    return [(record[0], record[1], record[2], data) for record, data in zip(messageRecords, datas)]
+
+
+def _sqlite_uri(path, immutable=False):
+    return f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro" + ("&immutable=1" if immutable else "")
+
+
+def connect_readonly(path, immutable=False):
+    """
+    Opens a sqlite3 file read-only with read-tuned pragmas. immutable=True also
+    skips file locking and change detection, so it is only safe for files that
+    are no longer written.
+    """
+    conn = sqlite3.connect(_sqlite_uri(path, immutable), uri=True)
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def has_topic_index(conn):
+    # True when an index of the messages table leads with (topic_id, timestamp)
+    for index in conn.execute("PRAGMA index_list('messages')").fetchall():
+        columns = [row[2] for row in conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()]
+        if columns[:2] == ["topic_id", "timestamp"]:
+            return True
+    return False
+
+
+def _split_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _topic_index_signature(index_path):
+    # the split (size, mtime_ns) a companion index was built from, None when missing or of another version
+    if not os.path.exists(index_path):
+        return None
+    try:
+        conn = sqlite3.connect(_sqlite_uri(index_path), uri=True)
+        try:
+            row = conn.execute("SELECT version, size, mtime_ns FROM source").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if row is None or row[0] != TOPIC_INDEX_VERSION:
+        return None
+    return tuple(row[1:])
+
+
+def build_topic_index(db_path, index_path, split_path):
+    """
+    Writes the companion index of a split: its (topic_id, timestamp, id) keys in
+    a WITHOUT ROWID table, stamped with the size/mtime of split_path so a
+    re-recorded split is detected. The bag itself is only read.
+    """
+    # stamped before the copy, so rows written meanwhile make the index out of date instead of missing
+    signature = _split_signature(split_path)
+    tmp_path = index_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS bag", (_sqlite_uri(db_path),))
+        conn.executescript("""
+            CREATE TABLE message_keys(topic_id INTEGER NOT NULL, timestamp INTEGER NOT NULL, id INTEGER NOT NULL,
+                                      PRIMARY KEY (topic_id, timestamp, id)) WITHOUT ROWID;
+            CREATE TABLE source(version INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL);
+            INSERT INTO message_keys SELECT topic_id, timestamp, id FROM bag.messages ORDER BY topic_id, timestamp, id;
+        """)
+        conn.execute("INSERT INTO source VALUES (?, ?, ?)", (TOPIC_INDEX_VERSION, *signature))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+    return signature
+
+
+class BagFile:
+    def __init__(self, path, starting_time=None, duration=None, message_count=None, build_index=False):
+        self.path = path
+        self.starting_time = starting_time
+        self.duration = duration
+        self.message_count = message_count
+        self.compressed = path.endswith(".zstd")
+        self.build_index = build_index
+        # "table" when the bag indexes (topic_id, timestamp) itself, "companion" for an attached topic index file
+        self.topic_index = None
+        # split (size, mtime_ns) the attached companion index was built from
+        self._index_signature = None
+        self._db_path = None
+        self._cleanup = None
+        self._conn = None
+        self._topics = None
+
+    def overlaps(self, start=None, end=None):
+        # splits without recorded time ranges are never skipped
+        if self.starting_time is None or self.duration is None:
+            return True
+        if start is not None and self.starting_time + self.duration < start:
+            return False
+        if end is not None and self.starting_time > end:
+            return False
+        return True
+
+    @property
+    def db_path(self):
+        # the sqlite3 file; file-mode compressed splits are decompressed on first use and removed on close
+        if self._db_path is None:
+            if self.compressed:
+                self._db_path = decompress_file(self.path)
+                self._cleanup = weakref.finalize(self, os.remove, self._db_path)
+            else:
+                self._db_path = self.path
+        return self._db_path
+
+    @property
+    def decompressed(self):
+        # False while a file-mode compressed split has not been decompressed yet
+        return not self.compressed or self._db_path is not None
+
+    @property
+    def immutable(self):
+        # decompressed copies and splits closed by the recorder (message_count in metadata.yaml) no longer change
+        if self.compressed:
+            return True
+        return self.message_count is not None and not os.path.exists(self.path + "-wal")
+
+    def _attachTopicIndex(self, conn):
+        if has_topic_index(conn):
+            return "table"
+        if os.path.exists(self.path + "-wal"):
+            # rows still in the write-ahead log do not change the split file, so a companion index cannot tell
+            return None
+        index_path = self.path + TOPIC_INDEX_SUFFIX
+        signature = _topic_index_signature(index_path)
+        if signature is None or signature != _split_signature(self.path):
+            if not self.build_index:
+                return None
+            print(f"[INFO] Building topic index {index_path}")
+            try:
+                signature = build_topic_index(self.db_path, index_path, self.path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[WARN] Could not build topic index {index_path}: {e}")
+                return None
+        conn.execute("ATTACH DATABASE ? AS topic_index", (_sqlite_uri(index_path, immutable=True),))
+        self._index_signature = signature
+        return "companion"
+
+    def _createTopicViews(self, conn):
+        # topic_keys (id, topic_id, timestamp) and topic_messages (... , data) serve per-topic queries
+        # through the (topic_id, timestamp) index of the bag or of the companion file when there is one
+        conn.executescript("DROP VIEW IF EXISTS temp.topic_keys; DROP VIEW IF EXISTS temp.topic_messages;")
+        if self.topic_index == "companion":
+            conn.executescript("""
+                CREATE TEMP VIEW topic_keys AS SELECT id, topic_id, timestamp FROM topic_index.message_keys;
+                CREATE TEMP VIEW topic_messages AS
+                    SELECT k.id AS id, k.topic_id AS topic_id, k.timestamp AS timestamp, m.data AS data
+                    FROM topic_index.message_keys AS k JOIN main.messages AS m ON m.id = k.id;
+            """)
+        else:
+            conn.executescript("""
+                CREATE TEMP VIEW topic_keys AS SELECT id, topic_id, timestamp FROM main.messages;
+                CREATE TEMP VIEW topic_messages AS SELECT id, topic_id, timestamp, data FROM main.messages;
+            """)
+
+    def _detachStaleTopicIndex(self):
+        # a split that grew since its companion index was built is read through its own messages table again
+        if os.path.exists(self.path + "-wal") or _split_signature(self.path) != self._index_signature:
+            print(f"[INFO] Topic index of {self.path} is out of date, reading without it")
+            self.topic_index = None
+            self._index_signature = None
+            self._createTopicViews(self._conn)
+            self._conn.execute("DETACH DATABASE topic_index")
+
+    def connect(self):
+        if self._conn is None:
+            conn = connect_readonly(self.db_path, self.immutable)
+            self.topic_index = self._attachTopicIndex(conn)
+            self._createTopicViews(conn)
+            self._conn = conn
+        elif self.topic_index == "companion":
+            self._detachStaleTopicIndex()
+        return self._conn
+
+    def getTopics(self):
+        # topic name -> (topic id in this split, message type)
+        if self._topics is None:
+            records = self.connect().execute('SELECT id, name, type FROM topics').fetchall()
+            self._topics = {name: (topicID, topicType) for topicID, name, topicType in records}
+        return self._topics
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._topics = None
+            self.topic_index = None
+            self._index_signature = None
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+            self._db_path = None
+
+
+class BagReader:
+    def __init__(self, path, build_index=False):
+        # build_index writes a companion topic index next to splits that do not index (topic_id, timestamp)
+        path = path.rstrip("/")
+        self.build_index = build_index
+        self.bag_dir = path if os.path.isdir(path) else os.path.dirname(path)
+        self.metadata = None
+        self.files = []
+        # "zstd" when every message BLOB is compressed on its own
+        self.message_compression = None
+        self._topics = None
+
+        metadata_path = os.path.join(self.bag_dir, "metadata.yaml")
+        if os.path.exists(metadata_path):
+            self._loadMetadata(metadata_path)
+        elif os.path.isfile(path):
+            self.files = [BagFile(path, build_index=build_index)]
+        else:
+            paths = glob.glob(os.path.join(self.bag_dir, "*.db3")) + glob.glob(os.path.join(self.bag_dir, "*.db3.zstd"))
+            self.files = [BagFile(p, build_index=build_index) for p in sorted(paths, key=_splitIndex)]
+        if any(bag_file.compressed for bag_file in self.files):
+            _require_zstandard()
+
+    def _loadMetadata(self, metadata_path):
+        with open(metadata_path) as f:
+            self.metadata = yaml.safe_load(f)["rosbag2_bagfile_information"]
+
+        compression_format = self.metadata.get("compression_format") or ""
+        if compression_format not in ("", "zstd"):
+            raise ValueError(f"Unsupported bag compression format: {compression_format}")
+        if compression_format and self.metadata.get("compression_mode", "").upper() == "MESSAGE":
+            _require_zstandard()
+            self.message_compression = compression_format
+
+        entries = self.metadata.get("files") or [
+            {"path": relative_path} for relative_path in self.metadata.get("relative_file_paths", [])
+        ]
+        for entry in entries:
+            path = os.path.join(self.bag_dir, entry["path"])
+            if not os.path.exists(path) and os.path.exists(path + ".zstd"):
+                # metadata.yaml written before the split was compressed lists the plain .db3 name
+                path += ".zstd"
+            if not os.path.exists(path):
+                print(f"[WARN] Bag split listed in metadata.yaml not found: {path}")
+                continue
+            self.files.append(BagFile(
+                path,
+                entry.get("starting_time", {}).get("nanoseconds_since_epoch"),
+                entry.get("duration", {}).get("nanoseconds"),
+                entry.get("message_count"),
+                self.build_index,
+            ))
+
+        self._topics = {}
+        for topic in self.metadata.get("topics_with_message_count", []):
+            topic_metadata = topic["topic_metadata"]
+            self._topics[topic_metadata["name"]] = {
+                "type": topic_metadata["type"],
+                "message_count": topic.get("message_count"),
+            }
+
+    def getTopics(self):
+        # topic name -> {"type", "message_count"}; counts are unknown (None) without metadata.yaml
+        if self._topics is None:
+            self._topics = {}
+            for bag_file in self.files:
+                for name, (_, topicType) in bag_file.getTopics().items():
+                    self._topics.setdefault(name, {"type": topicType, "message_count": None})
+        return self._topics
+
+    def getStartTime(self):
+        # bag-wide first timestamp [ns], shared zero for comparing topics
+        if self.metadata is not None and "starting_time" in self.metadata:
+            return self.metadata["starting_time"]["nanoseconds_since_epoch"]
+        startTimes = [
+            bag_file.connect().execute('SELECT MIN(timestamp) FROM messages').fetchone()[0] for bag_file in self.files
+        ]
+        startTimes = [startTime for startTime in startTimes if startTime is not None]
+        return min(startTimes) if startTimes else None
+
+    def getFiles(self, start=None, end=None):
+        return [bag_file for bag_file in self.files if bag_file.overlaps(start, end)]
+
+    def close(self):
+        for bag_file in self.files:
+            bag_file.close()
@@ -0,0 +1,408 @@
+import functools
+import struct
+import numpy as np
+from rosidl_runtime_py.utilities import get_message
+
+# CDR encapsulation header (representation id + options) preceding every payload
+CDR_HEADER_SIZE = 4
+
+# ROS 2 field type -> (numpy type code of the CDR wire format, DataFrame column dtype)
+# The column dtypes keep the width of the message definition (float32 stays float32).
+primitive_type_map = {
+    'bool'    : ('u1', 'bool'),
+    'boolean' : ('u1', 'bool'),
+    'byte'    : ('u1', 'uint8'),
+    'octet'   : ('u1', 'uint8'),
+    'char'    : ('u1', 'uint8'),
+    'int8'    : ('i1', 'int8'),
+    'uint8'   : ('u1', 'uint8'),
+    'int16'   : ('i2', 'int16'),
+    'uint16'  : ('u2', 'uint16'),
+    'int32'   : ('i4', 'int32'),
+    'uint32'  : ('u4', 'uint32'),
+    'int64'   : ('i8', 'int64'),
+    'uint64'  : ('u8', 'uint64'),
+    'float'   : ('f4', 'float32'),
+    'float32' : ('f4', 'float32'),
+    'double'  : ('f8', 'float64'),
+    'float64' : ('f8', 'float64'),
+}
+
+# dtypes used instead when a column has gaps (e.g. variable-length arrays exploded into columns)
+nullable_dtype_map = {
+    'bool'   : 'boolean',
+    'int8'   : 'Int8',
+    'uint8'  : 'UInt8',
+    'int16'  : 'Int16',
+    'uint16' : 'UInt16',
+    'int32'  : 'Int32',
+    'uint32' : 'UInt32',
+    'int64'  : 'Int64',
+    'uint64' : 'UInt64',
+}
+
+time_types = ['builtin_interfaces/Time', 'builtin_interfaces/Duration']
+binary_types = ['uint8', 'char']
+
+
+class VariableLayoutError(Exception):
+    pass
+
+
+def _get_message_class(type_name):
+    parts = type_name.split('/')
+    if len(parts) == 2:
+        type_name = f"{parts[0]}/msg/{parts[1]}"
+    return get_message(type_name)
+
+
+def _parse_fixed_array(field_type):
+    """
+    Splits a fixed size array type into its element type and length.
+
+    Example:
+        _parse_fixed_array("double[3]")
+        >>> ("double", 3)
+        _parse_fixed_array("sequence<double>")
+        >>> None
+    """
+    if not field_type.endswith(']') or '<' in field_type:
+        return None
+    bracket_index = field_type.index('[')
+    return field_type[:bracket_index], int(field_type[bracket_index + 1:-1])
+
+
+def _compile_fields(type_name, prefix, leaves, arrays="explode"):
+    # leaves are (key, field type) for scalars and (key, (kind, element type, length or None)) for array columns
+    message_fields = _get_message_class(type_name).get_fields_and_field_types()
+    for field_name, field_type in message_fields.items():
+        key = prefix + field_name
+        fixed_array = _parse_fixed_array(field_type)
+        if field_type in primitive_type_map:
+            leaves.append((key, field_type))
+        elif field_type == 'string' or field_type.startswith('string<='):
+            leaves.append((key, 'string'))
+        elif field_type in time_types:
+            leaves.append((key + '/secs', 'int32'))
+            leaves.append((key + '/nsecs', 'uint32'))
+        elif arrays == "column" and (fixed_array is not None or field_type.startswith('sequence<')):
+            element_type, _ = _parse_element_type(field_type)
+            if element_type not in primitive_type_map:
+                raise VariableLayoutError(field_type)
+            kind = 'bytes' if element_type in binary_types else 'array'
+            leaves.append((key, (kind, element_type, None if fixed_array is None else fixed_array[1])))
+        elif fixed_array is not None:
+            element_type, length = fixed_array
+            # binary arrays are base64 strings and message arrays are not flattened by the legacy path
+            if element_type not in primitive_type_map or element_type in binary_types:
+                raise VariableLayoutError(field_type)
+            for i in range(length):
+                leaves.append((f"{key}/{i}", element_type))
+        elif '<' in field_type or '[' in field_type or field_type == 'wstring':
+            raise VariableLayoutError(field_type)
+        else:
+            _compile_fields(field_type, key + '/', leaves, arrays)
+    return leaves
+
+
+def _parse_element_type(field_type):
+    """
+    Strips sequence/array/bound decorations from a field type.
+
+    Example:
+        _parse_element_type("sequence<double, 3>")
+        >>> ("double", "sequence")
+        _parse_element_type("uint8[4]")
+        >>> ("uint8", "array")
+        _parse_element_type("string<=10")
+        >>> ("string", None)
+    """
+    kind = None
+    if field_type.startswith('sequence<'):
+        field_type = field_type[len('sequence<'):-1].split(',')[0].strip()
+        kind = 'sequence'
+    elif _parse_fixed_array(field_type) is not None:
+        field_type = _parse_fixed_array(field_type)[0]
+        kind = 'array'
+    if field_type.startswith('string<=') or field_type == 'wstring':
+        field_type = 'string'
+    return field_type, kind
+
+
+def _schema_fields(type_name, prefix, schema, arrays):
+    message_fields = _get_message_class(type_name).get_fields_and_field_types()
+    for field_name, field_type in message_fields.items():
+        key = prefix + field_name
+        element_type, kind = _parse_element_type(field_type)
+        if kind is not None:
+            if element_type in primitive_type_map:
+                dtype = primitive_type_map[element_type][1]
+            elif element_type == 'string':
+                dtype = 'category'
+            else:
+                dtype = 'object'
+            if arrays == "column" or (kind == 'array' and element_type in binary_types):
+                # one column of ndarrays/bytes, or of base64 strings for fixed binary arrays in the legacy layout
+                schema[key] = 'object'
+            elif kind == 'array':
+                for i in range(_parse_fixed_array(field_type)[1]):
+                    schema[f"{key}/{i}"] = dtype
+            else:
+                # one column per element, as many as the longest sequence
+                schema[key + '/*'] = dtype
+        elif element_type in primitive_type_map:
+            schema[key] = primitive_type_map[element_type][1]
+        elif element_type == 'string':
+            schema[key] = 'category'
+        elif element_type in time_types:
+            schema[key + '/secs'] = 'int32'
+            schema[key + '/nsecs'] = 'uint32'
+        else:
+            _schema_fields(element_type, key + '/', schema, arrays)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_column_schema(type_name, arrays):
+    schema = {}
+    _schema_fields(type_name, '', schema, arrays)
+    return schema
+
+
+def get_column_schema(type_name, arrays="explode"):
+    """
+    Returns the flattened columns of a message type and their DataFrame dtypes,
+    derived from the message definition alone. Sequences exploded into a
+    variable number of columns are listed once as "key/*".
+
+    Example:
+        get_column_schema("sensor_msgs/msg/JointState")
+        >>> {"header/stamp/secs": "int32", ..., "name/*": "category", "position/*": "float64", ...}
+    """
+    return dict(_get_column_schema(type_name, arrays))
+
+
+@functools.lru_cache(maxsize=None)
+def get_column_dtypes(type_name):
+    """
+    Returns the DataFrame dtypes of a message type's flattened columns, derived
+    from the message definition alone.
+
+    Returns (scalars, arrays): scalars maps a column to its dtype, arrays maps
+    the prefix of exploded sequence columns ("position" for "position/0", ...) to
+    the element dtype. Strings are categorical; object columns are left as they are.
+    """
+    scalars, arrays = {}, {}
+    for column, dtype in _get_column_schema(type_name, "explode").items():
+        if dtype == 'object':
+            continue
+        if column.endswith('/*'):
+            arrays[column[:-2]] = dtype
+        else:
+            scalars[column] = dtype
+    return scalars, arrays
+
+
+def apply_column_dtypes(df, type_name):
+    """
+    Casts the columns of a converted DataFrame to the dtypes of the message
+    definition. Integer and bool columns with gaps use the pandas nullable dtypes.
+    """
+    scalars, arrays = get_column_dtypes(type_name)
+    for column in df.columns:
+        dtype = scalars.get(column)
+        if dtype is None:
+            prefix, _, index = column.rpartition('/')
+            if index.isdigit():
+                dtype = arrays.get(prefix)
+        if dtype is None:
+            continue
+        if dtype != 'category' and df[column].isna().any():
+            dtype = nullable_dtype_map.get(dtype, dtype)
+        if df[column].dtype == dtype:
+            continue
+        try:
+            df[column] = df[column].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    return df
+
+
+def flatten_message_arrays(message, prefix='', flat=None):
+    """
+    Flattens a deserialized message into '/'-joined keys for the array column
+    mode: primitive arrays stay one ndarray value (a view of the message's
+    buffer where possible) and uint8/char arrays stay raw bytes.
+
+    Example:
+        flatten_message_arrays(joint_state)
+        >>> {"header/stamp/secs": 1, ..., "name": ["j0", "j1"], "position": array([0., 1.]), ...}
+    """
+    if flat is None:
+        flat = {}
+    for field_name, field_type in message.get_fields_and_field_types().items():
+        key = prefix + field_name
+        value = getattr(message, field_name)
+        element_type, kind = _parse_element_type(field_type)
+        if kind is not None and element_type in binary_types:
+            flat[key] = bytes(value)
+        elif kind is not None and element_type in primitive_type_map:
+            flat[key] = np.asarray(value, dtype=primitive_type_map[element_type][1])
+        elif kind is not None and element_type == 'string':
+            flat[key] = list(value)
+        elif kind is not None:
+            flat[key] = [flatten_message_arrays(item) for item in value]
+        elif element_type in time_types:
+            flat[key + '/secs'] = value.sec
+            flat[key + '/nsecs'] = value.nanosec
+        elif element_type in primitive_type_map or element_type == 'string':
+            flat[key] = value
+        else:
+            flatten_message_arrays(value, key + '/', flat)
+    return flat
+
+
+def _align(offset, size):
+    return (offset + size - 1) & ~(size - 1)
+
+
+class CdrDecoder:
+    """
+    Decodes the CDR payloads of one message type straight into column arrays.
+
+    The field layout is compiled once from get_fields_and_field_types(). Payloads
+    sharing a layout are decoded in bulk through np.frombuffer with a structured
+    dtype; string fields only shift the layout, so payloads are grouped by size
+    and string lengths before the bulk decode.
+
+    With arrays="column", primitive arrays and sequences are subarray fields of
+    the structured dtype: each row of the column is an ndarray view of the
+    joined payload buffer, and uint8/char arrays are raw bytes.
+
+    Example:
+        decoder = get_decoder("geometry_msgs/msg/WrenchStamped")
+        columns = decoder.decode([row_data, ...])
+        columns["wrench/force/x"]
+    """
+
+    def __init__(self, type_name, arrays="explode"):
+        self.type_name = type_name
+        self.arrays = arrays
+        self.leaves = _compile_fields(type_name, '', [], arrays)
+        self.columns = [key for key, _ in self.leaves]
+
+    def _structured_dtype(self, sample):
+        if len(sample) < CDR_HEADER_SIZE:
+            raise ValueError(f"Truncated CDR payload for {self.type_name}")
+        byteorder = '<' if sample[1] & 1 else '>'
+        names, formats, offsets = ['__encapsulation'], ['u1'], [1]
+        checks = [('__encapsulation', sample[1])]
+
+        offset = 0
+        for key, field_type in self.leaves:
+            if field_type == 'string':
+                offset = _align(offset, 4)
+                if CDR_HEADER_SIZE + offset + 4 > len(sample):
+                    raise ValueError(f"Truncated CDR payload for {self.type_name}")
+                length, = struct.unpack_from(byteorder + 'I', sample, CDR_HEADER_SIZE + offset)
+                names += [f"__len_{key}", key]
+                formats += [byteorder + 'u4', f"S{max(length, 1)}"]
+                offsets += [CDR_HEADER_SIZE + offset, CDR_HEADER_SIZE + offset + 4]
+                checks.append((f"__len_{key}", length))
+                offset += 4 + length
+            elif isinstance(field_type, tuple):
+                _, element_type, length = field_type
+                if length is None:
+                    # sequences carry their element count; the elements only shift the layout like strings
+                    offset = _align(offset, 4)
+                    if CDR_HEADER_SIZE + offset + 4 > len(sample):
+                        raise ValueError(f"Truncated CDR payload for {self.type_name}")
+                    length, = struct.unpack_from(byteorder + 'I', sample, CDR_HEADER_SIZE + offset)
+                    names.append(f"__len_{key}")
+                    formats.append(byteorder + 'u4')
+                    offsets.append(CDR_HEADER_SIZE + offset)
+                    checks.append((f"__len_{key}", length))
+                    offset += 4
+                element_dtype = np.dtype(primitive_type_map[element_type][1]).newbyteorder(byteorder)
+                # empty sequences are not aligned
+                if length:
+                    offset = _align(offset, element_dtype.itemsize)
+                names.append(key)
+                formats.append((element_dtype, (length,)))
+                offsets.append(CDR_HEADER_SIZE + offset)
+                offset += element_dtype.itemsize * length
+            else:
+                wire_type = primitive_type_map[field_type][0]
+                size = int(wire_type[1])
+                offset = _align(offset, size)
+                names.append(key)
+                formats.append(byteorder + wire_type)
+                offsets.append(CDR_HEADER_SIZE + offset)
+                offset += size
+
+        if CDR_HEADER_SIZE + offset > len(sample):
+            raise ValueError(f"Truncated CDR payload for {self.type_name}")
+        dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': len(sample)})
+        return dtype, checks
+
+    def _allocate(self, count):
+        columns = {}
+        for key, field_type in self.leaves:
+            if field_type == 'string' or isinstance(field_type, tuple):
+                columns[key] = np.empty(count, dtype=object)
+            else:
+                columns[key] = np.empty(count, dtype=primitive_type_map[field_type][1])
+        return columns
+
+    def decode(self, blobs):
+        count = len(blobs)
+        columns = self._allocate(count)
+        if count == 0:
+            return columns
+
+        lengths = np.fromiter(map(len, blobs), dtype=np.int64, count=count)
+        for length in np.unique(lengths):
+            pending = np.flatnonzero(lengths == length)
+            while pending.size:
+                dtype, checks = self._structured_dtype(blobs[pending[0]])
+                records = np.frombuffer(b"".join([blobs[i] for i in pending]), dtype=dtype)
+
+                matched = np.ones(pending.size, dtype=bool)
+                for name, expected in checks:
+                    matched &= records[name] == expected
+                rows = pending[matched]
+                if not matched.all():
+                    records = records[matched]
+
+                for key, field_type in self.leaves:
+                    if field_type == 'string':
+                        values, inverse = np.unique(records[key], return_inverse=True)
+                        decoded = np.array([value.decode('utf-8') for value in values], dtype=object)
+                        columns[key][rows] = decoded[inverse]
+                    elif isinstance(field_type, tuple):
+                        # cells are set one by one so numpy does not broadcast the rows into a 2-D object array
+                        column = columns[key]
+                        values = records[key]
+                        if field_type[0] == 'bytes':
+                            for row, value in zip(rows, values):
+                                column[row] = value.tobytes()
+                        else:
+                            for row, value in zip(rows, values):
+                                column[row] = value
+                    else:
+                        columns[key][rows] = records[key]
+                pending = pending[~matched]
+
+        return columns
+
+
+@functools.lru_cache(maxsize=None)
+def get_decoder(type_name, arrays="explode"):
+    """
+    Returns the compiled decoder for a message type, or None when the type has
+    sequences or other variable-length fields that need the per-message path.
+    With arrays="column" only string and message sequences need that path.
+    """
+    try:
+        return CdrDecoder(type_name, arrays)
+    except VariableLayoutError:
+        return None
@@ -0,0 +1,90 @@
+import sys
+import time
+import contextlib
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak memory is then reported as None
+    resource = None
+
+stats_columns = ["topic", "stage", "calls", "seconds", "messages", "bytes", "msgs_per_sec", "peak_rss_mb"]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class ConversionStats:
+    """
+    Collects wall time, message counts and bytes per topic and conversion stage
+    (fetch, decode, deserialize, convert, dataframe, cache_read, ...).
+    Every finished stage is also passed to the optional callback, e.g. to push
+    it to an external metrics system.
+
+    Example:
+        stats = ConversionStats(callback=print)
+        with stats.measure("/sg/pressure", "fetch") as record:
+            rows = fetch()
+            record["messages"] = len(rows)
+        stats.toDataFrame()
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.records = []
+
+    def add(self, topic_name, stage, seconds, messages=0, nbytes=0):
+        record = {
+            "topic": topic_name,
+            "stage": stage,
+            "seconds": seconds,
+            "messages": messages,
+            "bytes": nbytes,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    @contextlib.contextmanager
+    def measure(self, topic_name, stage):
+        counters = {"messages": 0, "bytes": 0}
+        startTime = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.add(topic_name, stage, time.perf_counter() - startTime, counters["messages"], counters["bytes"])
+
+    def timed(self, func, totals, stage):
+        # wraps a per-message function so its wall time adds up in totals[stage]
+        def timedFunc(*args):
+            startTime = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                totals[stage] += time.perf_counter() - startTime
+        return timedFunc
+
+    def reset(self):
+        self.records = []
+
+    def toDataFrame(self):
+        # one row per (topic, stage); peak_rss_mb is the process peak when the stage last finished
+        if not self.records:
+            return pd.DataFrame(columns=stats_columns)
+        df = pd.DataFrame(self.records).groupby(["topic", "stage"], sort=False).agg(
+            calls=("seconds", "size"),
+            seconds=("seconds", "sum"),
+            messages=("messages", "sum"),
+            bytes=("bytes", "sum"),
+            peak_rss_mb=("peak_rss_mb", "max"),
+        ).reset_index()
+        df["msgs_per_sec"] = (df["messages"] / df["seconds"]).where((df["messages"] > 0) & (df["seconds"] > 0))
+        return df[stats_columns]
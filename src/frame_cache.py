@@ -0,0 +1,92 @@
+import threading
+import collections
+import pandas as pd
+
+# upper bound of the DataFrames kept in memory by all BagConverter instances of the process
+DEFAULT_MAX_BYTES = 2 << 30
+
+
+def _copy_on_write():
+    # pandas 3 always copies on write; pandas 2 only with the option enabled
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    """
+    Least recently used DataFrames, evicted by their total memory size.
+    Frames are handed out as copy-on-write views (deep copies without pandas
+    copy-on-write), so callers can modify them without touching the cache.
+
+    Example:
+        cache = FrameCache(max_bytes=512 << 20)
+        cache.put(key, df)
+        df = cache.get(key)
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _copy(self, df):
+        return df.copy(deep=not _copy_on_write())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key):
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+        return self._copy(entry[0])
+
+    def put(self, key, df):
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            if key in self._frames:
+                self.nbytes -= self._frames.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._frames[key] = (self._copy(df), nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._frames:
+            _, (_, nbytes) = self._frames.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                "frames": len(self._frames),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+shared_cache = FrameCache()
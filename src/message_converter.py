@@ -39,7 +39,8 @@ from std_msgs.msg import Header
 import rclpy
 import base64
 import sys
-import copy
+import functools
+import operator
 import numpy as np
 
 python3 = (sys.hexversion > 0x03000000)
@@ -79,6 +80,55 @@ ros_primitive_types = ['bool', 'boolean', 'byte', 'char', 'double', 'int8', 'uin
                        'float','float32', 'float64', 'string']
 ros_header_types = ['Header', 'std_msgs/Header', 'roslib/Header']
 
+# message class -> flattened conversion plan, see convert_ros_message_to_flat_dictionary()
+_flat_plans = {}
+
+@functools.lru_cache(maxsize=None)
+def _get_message_class(message_type):
+    return message_helpers.get_message_class(message_type)
+
+@functools.lru_cache(maxsize=None)
+def _get_field_plan(message_class):
+    """
+    Classifies the fields of a message class once: (field name, field type, kind, list type).
+    The kinds follow the branches of _convert_from_ros_type().
+    """
+    return tuple(
+        (field_name, field_type) + _classify_from_ros_type(field_type)
+        for field_name, field_type in message_class.get_fields_and_field_types().items()
+    )
+
+@functools.lru_cache(maxsize=None)
+def _classify_from_ros_type(field_type):
+    if field_type in ros_primitive_types:
+        return 'primitive', None
+    if field_type in ros_time_types:
+        return 'time', None
+    if _is_ros_binary_type(field_type):
+        return 'binary', None
+    if _is_field_type_a_primitive_array(field_type):
+        return 'primitive_array', None
+    if _is_field_type_an_array(field_type):
+        return 'array', field_type[field_type.index("<")+1:-1]
+    return 'other', None
+
+@functools.lru_cache(maxsize=None)
+def _classify_to_ros_type(field_type):
+    # the branches of _convert_to_ros_type(), in the same order
+    if _is_ros_binary_type(field_type):
+        return 'binary', None
+    if _is_field_type_binary_type_array(field_type):
+        return 'binary_array', None
+    if field_type in ros_time_types:
+        return 'time', None
+    if field_type in ros_primitive_types:
+        return 'primitive', None
+    if _is_field_type_a_primitive_array(field_type):
+        return 'primitive_array', None
+    if _is_field_type_an_array(field_type):
+        return 'array', field_type[field_type.index("<")+1:-1]
+    return 'message', None
+
 def convert_dictionary_to_ros_message(message_type, dictionary, kind='message', strict_mode=True, check_missing_fields=False, check_types=True):
     """
     Takes in the message type and a Python dictionary and returns a ROS message.
@@ -96,7 +146,7 @@ def convert_dictionary_to_ros_message(message_type, dictionary, kind='message',
     #print(message_type)
     if type(message_type) == str:
         if kind == 'message':
-            message_class = message_helpers.get_message_class(message_type)
+            message_class = _get_message_class(message_type)
             message = message_class()
         elif kind == 'request':
             service_class = message_helpers.get_service_class(message_type)
@@ -111,9 +161,8 @@ def convert_dictionary_to_ros_message(message_type, dictionary, kind='message',
     else:
         message = message_type()
     #message = message_type()
-    message_fields = message.get_fields_and_field_types()
+    message_fields = {field_name: field_type for field_name, field_type, _, _ in _get_field_plan(type(message))}
     #print(message_fields)
-    remaining_message_fields = copy.deepcopy(message_fields)
 
     for field_name, field_value in dictionary.items():
         if field_name in message_fields:
@@ -121,7 +170,6 @@ def convert_dictionary_to_ros_message(message_type, dictionary, kind='message',
             #print(field_type)
             field_value = _convert_to_ros_type(field_name, field_type, field_value, check_types)
             setattr(message, field_name, field_value)
-            del remaining_message_fields[field_name]
         else:
             if type(message) != Header:
                 error_message = 'ROS message type "{0}" has no field named "{1}"'\
@@ -132,6 +180,9 @@ def convert_dictionary_to_ros_message(message_type, dictionary, kind='message',
                     #rospy.logerr('{}! It will be ignored.'.format(error_message))
                     print('{}! It will be ignored.'.format(error_message))
 
+    remaining_message_fields = {
+        field_name: field_type for field_name, field_type in message_fields.items() if field_name not in dictionary
+    }
     if check_missing_fields and remaining_message_fields:
         error_message = 'Missing fields "{0}"'.format(remaining_message_fields)
         raise ValueError(error_message)
@@ -142,13 +193,14 @@ def _convert_to_ros_type(field_name, field_type, field_value, check_types=True):
     #print(field_type)
     #print(ros_primitive_types)
     #print(field_type in ros_time_types)
-    if _is_ros_binary_type(field_type):
+    kind, list_type = _classify_to_ros_type(field_type)
+    if kind == 'binary':
         field_value = _convert_to_ros_binary(field_type, field_value)
-    elif _is_field_type_binary_type_array(field_type):
+    elif kind == 'binary_array':
         field_value = list(bytearray(base64.b64decode(field_value)))
-    elif field_type in ros_time_types:
+    elif kind == 'time':
         field_value = _convert_to_ros_time(field_type, field_value)
-    elif field_type in ros_primitive_types:
+    elif kind == 'primitive':
         # Note: one could also use genpy.message.check_type() here, but:
         # 1. check_type is "not designed to run fast and is meant only for error diagnosis"
         # 2. it doesn't check floats (see ros/genpy#130)
@@ -159,9 +211,9 @@ def _convert_to_ros_type(field_name, field_type, field_value, check_types=True):
     #elif field_type in ros_header_types:
     #    field_value = _convert_to_ros_header(field_value)
 
-    elif _is_field_type_a_primitive_array(field_type):
+    elif kind == 'primitive_array':
         field_value = field_value
-    elif _is_field_type_an_array(field_type):
+    elif kind == 'array':
         field_value = _convert_to_ros_array(field_name, field_type, field_value, check_types)
     else:
         field_value = convert_dictionary_to_ros_message(field_type, field_value)
@@ -224,7 +276,7 @@ def _convert_to_ros_primitive(field_type, field_value):
 def _convert_to_ros_array(field_name, field_type, list_value, check_types=True):
     # use index to raise ValueError if '[' not present
     #list_type = field_type[:field_type.index('[')]
-    list_type = field_type[field_type.index("<")+1:-1]
+    list_type = _classify_to_ros_type(field_type)[1]
     return [_convert_to_ros_type(field_name, list_type, value, check_types) for value in list_value]
 
 def convert_ros_message_to_dictionary(message):
@@ -237,23 +289,93 @@ def convert_ros_message_to_dictionary(message):
     """
     dictionary = {}
     #message_fields = _get_message_fields(message)
-    message_fields = message.get_fields_and_field_types()
-    for (field_name, field_type) in message_fields.items():
+    for field_name, field_type, kind, list_type in _get_field_plan(type(message)):
         field_value = getattr(message, field_name)
-        dictionary[field_name] = _convert_from_ros_type(field_type, field_value)
+        dictionary[field_name] = _convert_from_ros_value(kind, list_type, field_type, field_value)
     return dictionary
 
+def convert_ros_message_to_flat_dictionary(message):
+    """
+    Takes in a ROS message and returns a flat Python dictionary with '/'-joined keys,
+    the same as flattening convert_ros_message_to_dictionary(): nested messages become
+    "parent/child" keys, times "stamp/secs" and "stamp/nsecs", and arrays one key per
+    element ("position/0", "position/1", ...).
+
+    The conversion plan of every message class is built once from the first message,
+    so converting a message is a loop over precomputed attribute getters.
+
+    Example:
+        ros_message = geometry_msgs.msg.WrenchStamped()
+        flat_message = convert_ros_message_to_flat_dictionary(ros_message)
+        flat_message["wrench/force/x"]
+    """
+    plan = _flat_plans.get(type(message))
+    if plan is None:
+        plan = _flat_plans[type(message)] = _build_flat_plan(message, '', (), [])
+
+    flat = {}
+    for key, getter, convert, emit in plan:
+        value = getter(message)
+        if convert is not None:
+            value = convert(value)
+        if emit == 'value':
+            flat[key] = value
+        elif emit == 'list':
+            for i, item in enumerate(value):
+                flat[key + '/' + str(i)] = item
+        else:
+            _flatten_value(flat, key, value)
+    return flat
+
+def _build_flat_plan(message, prefix, path, plan):
+    # plan entries are (key, attribute getter, value converter, emit) with emit 'value', 'list' or 'any'
+    for field_name, field_type, kind, list_type in _get_field_plan(type(message)):
+        key = prefix + field_name
+        field_path = path + (field_name,)
+        getter = operator.attrgetter('.'.join(field_path))
+        field_value = getattr(message, field_name)
+        if kind == 'primitive':
+            plan.append((key, getter, None, 'value'))
+        elif kind == 'time':
+            plan.append((key + '/secs', operator.attrgetter('.'.join(field_path + ('sec',))), None, 'value'))
+            plan.append((key + '/nsecs', operator.attrgetter('.'.join(field_path + ('nanosec',))), None, 'value'))
+        elif kind == 'binary':
+            plan.append((key, getter, functools.partial(_convert_from_ros_binary, field_type), 'value'))
+        elif kind == 'primitive_array':
+            plan.append((key, getter, None, 'list'))
+        elif kind == 'array':
+            plan.append((key, getter, functools.partial(_convert_from_ros_array, field_type), 'list'))
+        elif hasattr(field_value, 'get_fields_and_field_types') and type(field_value) != np.ndarray:
+            _build_flat_plan(field_value, key + '/', field_path, plan)
+        else:
+            plan.append((key, getter, functools.partial(_convert_from_ros_value, kind, list_type, field_type), 'any'))
+    return plan
+
+def _flatten_value(flat, key, value):
+    if isinstance(value, dict):
+        for child_key, child_value in value.items():
+            _flatten_value(flat, key + '/' + child_key, child_value)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            flat[key + '/' + str(i)] = item
+    else:
+        flat[key] = value
+
 def _convert_from_ros_type(field_type, field_value):
-    if field_type in ros_primitive_types:
+    kind, list_type = _classify_from_ros_type(field_type)
+    return _convert_from_ros_value(kind, list_type, field_type, field_value)
+
+def _convert_from_ros_value(kind, list_type, field_type, field_value):
+    if kind == 'primitive':
         field_value = field_value
-    elif field_type in ros_time_types:
+    elif kind == 'time':
         field_value = _convert_from_ros_time(field_type, field_value)
-    elif _is_ros_binary_type(field_type):
+    elif kind == 'binary':
         field_value = _convert_from_ros_binary(field_type, field_value)
-    elif _is_field_type_a_primitive_array(field_type):
+    elif kind == 'primitive_array':
         field_value = list(field_value)
-    elif _is_field_type_an_array(field_type):
-        field_value = _convert_from_ros_array(field_type, field_value)
+    elif kind == 'array':
+        field_value = [_convert_from_ros_type(list_type, value) for value in field_value]
     elif field_type == np.ndarray or type(field_value) == np.ndarray:
         print("Unsupported type: ", field_type)
         return None
@@ -300,7 +422,7 @@ def _convert_from_ros_time(field_type, field_value):
 def _convert_from_ros_array(field_type, field_value):
     # use index to raise ValueError if '[' not present
     #list_type = field_type[:field_type.index('[')]
-    list_type = field_type[field_type.index("<")+1:-1]
+    list_type = _classify_from_ros_type(field_type)[1]
     #list_type = field_type.split("<")[1][:-1]
     return [_convert_from_ros_type(list_type, value) for value in field_value]
 
@@ -0,0 +1,241 @@
+import os
+import json
+import tempfile
+import contextlib
+import zoneinfo
+import dateutil.tz
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows; concurrent manifest updates then rely on the merge alone
+    fcntl = None
+
+# rows per Arrow record batch / Parquet row group; the unit skipped by time-window reads
+CACHE_BATCH_ROWS = 65_536
+BATCH_RANGES_KEY = b"bag_converter.msec_ranges"
+
+cache_extensions = ["feather", "arrow", "parquet", "csv"]
+
+# bump whenever the layout of the converted DataFrames changes, so older caches are rebuilt
+CACHE_VERSION = 3
+MANIFEST_NAME = "cache_manifest.json"
+
+
+def local_time_zone():
+    """
+    The IANA zone of TZ or of the /etc/localtime link, so every timestamp gets the
+    daylight saving offset of its own date; anything else falls back to dateutil's
+    tzlocal(), which asks time.localtime per timestamp.
+    """
+    name = os.environ.get("TZ", "").lstrip(":")
+    if not name and os.path.islink("/etc/localtime"):
+        _, _, name = os.path.realpath("/etc/localtime").partition("zoneinfo/")
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (ValueError, OSError, zoneinfo.ZoneInfoNotFoundError):
+            pass
+    return dateutil.tz.tzlocal()
+
+
+def _batch_ranges(batches):
+    ranges = []
+    for batch in batches:
+        msec = batch.column("msec").to_numpy(zero_copy_only=False)
+        ranges.append([float(np.nanmin(msec)), float(np.nanmax(msec))])
+    return ranges
+
+
+def write_topic_cache(df, path, ext="feather"):
+    """
+    Writes one topic DataFrame as a cache file.
+
+    feather/arrow are Arrow IPC files written in record batches of CACHE_BATCH_ROWS,
+    with the msec range of every batch stored in the schema metadata; arrow is
+    uncompressed so reads are zero-copy from the memory map. parquet stores the
+    same ranges as row group statistics.
+    """
+    if ext == "csv":
+        df.to_csv(path, index=False)
+        return
+    if ext not in cache_extensions:
+        raise ValueError("Unsupported cache extension")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if ext == "parquet":
+        pq.write_table(table, path, row_group_size=CACHE_BATCH_ROWS)
+        return
+
+    batches = table.combine_chunks().to_batches(max_chunksize=CACHE_BATCH_ROWS)
+    schema = table.schema
+    if "msec" in df.columns and batches:
+        metadata = dict(schema.metadata or {})
+        metadata[BATCH_RANGES_KEY] = json.dumps(_batch_ranges(batches)).encode()
+        schema = schema.with_metadata(metadata)
+
+    compression = None if ext == "arrow" else "lz4"
+    with pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=compression)) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _read_ipc(path, columns, msec_window):
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    schema = reader.schema
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns)
+        if msec_window is not None and "msec" not in read_columns:
+            read_columns.append("msec")
+        missing = [name for name in read_columns if schema.get_field_index(name) < 0]
+        if missing:
+            raise KeyError(f"Columns not found in cache: {missing}")
+        reader = pa.ipc.open_file(
+            pa.memory_map(path, "r"),
+            options=pa.ipc.IpcReadOptions(included_fields=[schema.get_field_index(name) for name in read_columns]),
+        )
+
+    batch_indices = range(reader.num_record_batches)
+    ranges = (schema.metadata or {}).get(BATCH_RANGES_KEY)
+    if msec_window is not None and ranges is not None:
+        ranges = json.loads(ranges)
+        start, end = msec_window
+        batch_indices = [
+            i for i in batch_indices
+            if (start is None or ranges[i][1] >= start) and (end is None or ranges[i][0] <= end)
+        ]
+
+    batches = [reader.get_batch(i) for i in batch_indices]
+    if batches:
+        table = pa.Table.from_batches(batches)
+    else:
+        table = reader.schema.empty_table()
+    if read_columns is not None:
+        table = table.select(read_columns)
+    return table.to_pandas()
+
+
+def read_topic_cache(path, ext="feather", columns=None, msec_window=None):
+    """
+    Reads a topic cache file, optionally only some columns and only the rows
+    whose msec lies inside msec_window = (start, end) (either end may be None).
+
+    Arrow IPC files (feather/arrow) are memory-mapped, so only the requested
+    columns of the record batches overlapping the window are paged in. Parquet
+    reads skip row groups through their msec statistics.
+    """
+    if ext in ("feather", "arrow"):
+        df = _read_ipc(path, columns, msec_window)
+    elif ext == "parquet":
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns)
+            if msec_window is not None and "msec" not in read_columns:
+                read_columns.append("msec")
+        filters = None
+        if msec_window is not None:
+            filters = [("msec", op, value) for op, value in zip((">=", "<="), msec_window) if value is not None] or None
+        df = pq.read_table(path, columns=read_columns, filters=filters, memory_map=True).to_pandas()
+    elif ext == "csv":
+        usecols = None
+        if columns is not None:
+            usecols = list(columns) + (["msec"] if msec_window is not None and "msec" not in columns else [])
+        df = pd.read_csv(path, usecols=usecols)
+        if columns is not None:
+            df = df[usecols]
+        if "datetime" in df.columns:
+            # the written offsets change with daylight saving time, so parse as UTC and convert back to the local zone
+            df["datetime"] = pd.to_datetime(df["datetime"], format="ISO8601", utc=True).dt.as_unit("ns").dt.tz_convert(
+                local_time_zone()
+            )
+    else:
+        raise ValueError("Unsupported cache extension")
+
+    if msec_window is not None:
+        start, end = msec_window
+        if start is not None:
+            df = df[df["msec"] >= start]
+        if end is not None:
+            df = df[df["msec"] <= end]
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
+
+
+def count_topic_cache_rows(path, ext="feather"):
+    """Returns the number of rows in a topic cache file, from its footer where the format has one."""
+    if ext in ("feather", "arrow"):
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    if ext == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    if ext == "csv":
+        try:
+            return len(pd.read_csv(path, usecols=[0]))
+        except pd.errors.EmptyDataError:
+            return 0
+    raise ValueError("Unsupported cache extension")
+
+
+class CacheManifest:
+    """
+    Records, per cache file, what it was converted from: the converter version,
+    the topic start timestamp used as msec zero, the number of rows written, and
+    for every bag split its size/mtime and the topic's message count and max
+    rowid/timestamp in it.
+
+    Several converters may share a bag directory, so the file is re-read on
+    every access and an update only replaces its own entry.
+
+    Example:
+        manifest = CacheManifest(bag_dir)
+        entry = manifest.getEntry("sg_pressure.feather")
+    """
+
+    def __init__(self, bag_dir):
+        self.path = os.path.join(bag_dir, MANIFEST_NAME)
+
+    def getEntry(self, cache_name):
+        return self._load().get(cache_name)
+
+    def setEntry(self, cache_name, entry):
+        with self._locked():
+            entries = self._load()
+            entries[cache_name] = entry
+            fd, tmp_path = tempfile.mkstemp(prefix=MANIFEST_NAME, suffix=".tmp", dir=os.path.dirname(self.path))
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"caches": entries}, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("caches", {})
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Ignoring unreadable cache manifest {self.path}: {e}")
+            return {}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # serialises the read-merge-write of setEntry between processes
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
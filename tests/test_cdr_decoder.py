@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("rclpy")
+typesys = pytest.importorskip("rosbags.typesys")
+
+import cdr_decoder
+import message_converter
+from rclpy.serialization import deserialize_message
+from rosidl_runtime_py.utilities import get_message
+
+typestore = typesys.get_typestore(typesys.Stores.ROS2_HUMBLE)
+T = typestore.types
+
+MESSAGES = 12
+
+
+def _time(i):
+    return T["builtin_interfaces/msg/Time"](sec=1_700_000_000 + i, nanosec=i * 1_000_003)
+
+
+def _header(i):
+    # frame ids of different lengths shift the layout of everything after them
+    return T["std_msgs/msg/Header"](stamp=_time(i), frame_id="imu_link"[:i % 9])
+
+
+def _vector3(rng):
+    x, y, z = rng.standard_normal(3)
+    return T["geometry_msgs/msg/Vector3"](x=x, y=y, z=z)
+
+
+def _imu(i, rng):
+    x, y, z, w = rng.standard_normal(4)
+    return T["sensor_msgs/msg/Imu"](
+        header=_header(i),
+        orientation=T["geometry_msgs/msg/Quaternion"](x=x, y=y, z=z, w=w),
+        orientation_covariance=rng.standard_normal(9),
+        angular_velocity=_vector3(rng),
+        angular_velocity_covariance=rng.standard_normal(9),
+        linear_acceleration=_vector3(rng),
+        linear_acceleration_covariance=rng.standard_normal(9),
+    )
+
+
+def _image(i, rng):
+    width = i % 4
+    return T["sensor_msgs/msg/Image"](
+        header=_header(i), height=2, width=width, encoding=["mono8", "rgb8"][i % 2], is_bigendian=0, step=width,
+        data=rng.integers(0, 256, size=2 * width, dtype=np.uint8),
+    )
+
+
+def _joy(i, rng):
+    # empty and odd-length sequences, so the int32 sequence after the float sequence is both aligned and not
+    return T["sensor_msgs/msg/Joy"](
+        header=_header(i), axes=rng.standard_normal(i % 3).astype(np.float32),
+        buttons=rng.integers(-5, 5, size=(i * 7) % 4, dtype=np.int32),
+    )
+
+
+def _joint_trajectory_point(i, rng):
+    return T["trajectory_msgs/msg/JointTrajectoryPoint"](
+        positions=rng.standard_normal(i % 4), velocities=rng.standard_normal((i + 1) % 3),
+        accelerations=np.array([], dtype=np.float64), effort=rng.standard_normal(i % 2),
+        time_from_start=T["builtin_interfaces/msg/Duration"](sec=i, nanosec=i * 17),
+    )
+
+
+def _channel_float32(i, rng):
+    return T["sensor_msgs/msg/ChannelFloat32"](name="rgb"[:i % 4], values=rng.standard_normal(i % 5).astype(np.float32))
+
+
+def _key_value(i, rng):
+    # equal payload sizes with different string lengths must not share a layout
+    return T["diagnostic_msgs/msg/KeyValue"](key="abcd"[:i % 5], value="wxyz"[:4 - i % 5])
+
+
+builders = {
+    "sensor_msgs/msg/Imu": _imu,
+    "sensor_msgs/msg/Image": _image,
+    "sensor_msgs/msg/Joy": _joy,
+    "trajectory_msgs/msg/JointTrajectoryPoint": _joint_trajectory_point,
+    "sensor_msgs/msg/ChannelFloat32": _channel_float32,
+    "diagnostic_msgs/msg/KeyValue": _key_value,
+}
+
+# types whose sequences or strings leave the exploded layout variable are decoded by the per-message path
+fixed_layout_types = ["sensor_msgs/msg/Imu", "diagnostic_msgs/msg/KeyValue"]
+
+
+def _serialize(type_name):
+    rng = np.random.default_rng(0)
+    # every third payload is big-endian, so both byte orders are grouped within one decode call
+    return [
+        bytes(typestore.serialize_cdr(builders[type_name](i, rng), type_name, little_endian=i % 3 != 2))
+        for i in range(MESSAGES)
+    ]
+
+
+def _assert_value(actual, expected, key):
+    if isinstance(expected, (str, bytes)):
+        assert actual == expected, key
+    else:
+        actual = np.asarray(actual)
+        np.testing.assert_array_equal(actual, np.asarray(expected, dtype=actual.dtype), err_msg=key)
+
+
+@pytest.mark.parametrize("type_name", list(builders))
+@pytest.mark.parametrize("arrays", ["explode", "column"])
+def test_decode_matches_per_message_path(type_name, arrays):
+    decoder = cdr_decoder.get_decoder(type_name, arrays)
+    if arrays == "explode" and type_name not in fixed_layout_types:
+        assert decoder is None
+        return
+    assert decoder is not None
+
+    blobs = _serialize(type_name)
+    columns = decoder.decode(blobs)
+    message_class = get_message(type_name)
+    for row, blob in enumerate(blobs):
+        message = deserialize_message(blob, message_class)
+        if arrays == "column":
+            expected = cdr_decoder.flatten_message_arrays(message)
+        else:
+            expected = message_converter.convert_ros_message_to_flat_dictionary(message)
+        assert list(columns) == list(expected)
+        for key, value in expected.items():
+            _assert_value(columns[key][row], value, key)
+
+
+def test_truncated_payload_raises():
+    blob = _serialize("sensor_msgs/msg/Imu")[0]
+    with pytest.raises(ValueError):
+        cdr_decoder.get_decoder("sensor_msgs/msg/Imu").decode([blob[:40]])
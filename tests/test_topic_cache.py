@@ -0,0 +1,189 @@
+import os
+import json
+import sqlite3
+import numpy as np
+import pytest
+
+import topic_cache
+import frame_cache
+import bag_benchmark
+
+HELD_BACK = 10
+
+
+def test_manifest_keeps_entries_of_other_instances(tmp_path):
+    first = topic_cache.CacheManifest(tmp_path)
+    second = topic_cache.CacheManifest(tmp_path)
+    first.setEntry("a.feather", {"rows": 1})
+    second.setEntry("b.feather", {"rows": 2})
+    first.setEntry("c.feather", {"rows": 3})
+
+    assert second.getEntry("a.feather") == {"rows": 1}
+    assert topic_cache.CacheManifest(tmp_path).getEntry("b.feather") == {"rows": 2}
+    second.setEntry("a.feather", {"rows": 4})
+    assert first.getEntry("a.feather") == {"rows": 4}
+
+
+@pytest.mark.parametrize("ext", topic_cache.cache_extensions)
+def test_count_topic_cache_rows(tmp_path, ext):
+    df = bag_benchmark.pd.DataFrame({"msec": np.arange(70_000, dtype=np.float64), "name": ["a", "b\nc"] * 35_000})
+    path = str(tmp_path / f"topic.{ext}")
+    topic_cache.write_topic_cache(df, path, ext)
+    assert topic_cache.count_topic_cache_rows(path, ext) == len(df)
+
+
+def test_csv_datetime_across_daylight_saving_change(tmp_path, monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    # 2024-03-31 01:00 UTC moves Berlin from +01:00 to +02:00
+    timestamps = np.arange(1_711_843_200, 1_711_850_400, 600, dtype=np.int64) * 1_000_000_000
+    datetime = bag_benchmark.pd.to_datetime(timestamps, unit="ns", utc=True).tz_convert(topic_cache.local_time_zone())
+    df = bag_benchmark.pd.DataFrame({"timestamp": timestamps, "datetime": datetime})
+    path = str(tmp_path / "topic.csv")
+    topic_cache.write_topic_cache(df, path, "csv")
+
+    cached = topic_cache.read_topic_cache(path, "csv")
+    assert str(cached["datetime"].dtype) == "datetime64[ns, Europe/Berlin]"
+    bag_benchmark.pd.testing.assert_series_equal(cached["datetime"], df["datetime"])
+
+
+@pytest.fixture
+def recording(tmp_path):
+    # a synthetic bag still being recorded: no metadata.yaml, and the messages from the last
+    # HELD_BACK wrench samples on are only written by grow()
+    pytest.importorskip("rclpy")
+    bag_dir = str(tmp_path / "recording")
+    bag_benchmark.generate_bag(bag_dir, duration_sec=2.0, array_size=10)
+    os.remove(os.path.join(bag_dir, "metadata.yaml"))
+    db_path = os.path.join(bag_dir, "recording_0.db3")
+
+    conn = sqlite3.connect(db_path)
+    cutoff, = conn.execute(
+        "SELECT timestamp FROM messages WHERE topic_id = 2 ORDER BY timestamp DESC LIMIT 1 OFFSET ?", (HELD_BACK - 1,)
+    ).fetchone()
+    held = conn.execute("SELECT id, topic_id, timestamp, data FROM messages WHERE timestamp >= ?", (cutoff,)).fetchall()
+    conn.execute("DELETE FROM messages WHERE timestamp >= ?", (cutoff,))
+    conn.commit()
+    conn.close()
+
+    def grow():
+        conn = sqlite3.connect(db_path)
+        conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?)", held)
+        conn.commit()
+        conn.close()
+        # a new mtime even on file systems with coarse timestamps
+        stat = os.stat(db_path)
+        os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    return bag_dir, db_path, grow
+
+
+def _converter(bag_dir):
+    import bag_converter
+
+    converter = bag_converter.BagConverter()
+    converter.connectDB(bag_dir)
+    # only the cache files and the manifest are under test
+    converter.frame_cache = None
+    return converter
+
+
+def _assert_same_rows(df, expected):
+    assert len(df) == len(expected)
+    assert df["timestamp"].is_unique
+    np.testing.assert_array_equal(df["timestamp"].to_numpy(), expected["timestamp"].to_numpy())
+    np.testing.assert_allclose(df["msec"].to_numpy(), expected["msec"].to_numpy())
+
+
+@pytest.mark.parametrize("ext", topic_cache.cache_extensions)
+def test_append_after_growth(recording, ext):
+    bag_dir, _, grow = recording
+    converter = _converter(bag_dir)
+    rows = len(converter.getTopicDataWithPandas("/sg/wrench", cache_ext=ext))
+
+    grow()
+    assert converter._checkCache("/sg/wrench", ext)[0] == "append"
+    df = converter.getTopicDataWithPandas("/sg/wrench", cache_ext=ext)
+    assert len(df) == rows + HELD_BACK
+    _assert_same_rows(df, converter.getTopicDataWithPandas("/sg/wrench", use_cache=False))
+    assert converter._checkCache("/sg/wrench", ext)[0] == "fresh"
+
+
+def test_converters_sharing_a_bag_keep_each_others_entries(recording):
+    bag_dir, _, grow = recording
+    first = _converter(bag_dir)
+    first.getTopicDataWithPandas("/sg/wrench")
+
+    grow()
+    second = _converter(bag_dir)
+    second.getTopicDataWithPandas("/sg/wrench")
+    # must not write back the wrench entry as first read it before the append
+    first.getTopicDataWithPandas("/sg/pressure")
+
+    third = _converter(bag_dir)
+    assert third._checkCache("/sg/wrench", "feather")[0] == "fresh"
+    _assert_same_rows(third.getTopicDataWithPandas("/sg/wrench"), third.getTopicDataWithPandas("/sg/wrench", use_cache=False))
+
+
+def test_stale_when_cache_rows_disagree(recording):
+    bag_dir, _, grow = recording
+    converter = _converter(bag_dir)
+    converter.getTopicDataWithPandas("/sg/wrench")
+
+    grow()
+    manifest_path = os.path.join(bag_dir, topic_cache.MANIFEST_NAME)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["caches"]["sg_wrench.feather"]["rows"] -= 1
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    assert converter._checkCache("/sg/wrench", "feather")[0] == "stale"
+
+
+@pytest.mark.parametrize("change", [
+    "DELETE FROM messages WHERE id = (SELECT MIN(id) FROM messages WHERE topic_id = 2)",
+    "UPDATE messages SET timestamp = timestamp + 1 WHERE id = ?",
+])
+def test_stale_when_converted_rows_change(recording, change):
+    bag_dir, db_path, grow = recording
+    converter = _converter(bag_dir)
+    converter.getTopicDataWithPandas("/sg/wrench")
+    lastID = converter.manifest.getEntry("sg_wrench.feather")["splits"]["recording_0.db3"]["max_id"]
+
+    grow()
+    conn = sqlite3.connect(db_path)
+    conn.execute(change, (lastID,) if "?" in change else ())
+    conn.commit()
+    conn.close()
+    assert converter._checkCache("/sg/wrench", "feather")[0] == "stale"
+
+
+def test_stale_when_split_shrinks(recording):
+    bag_dir, db_path, _ = recording
+    converter = _converter(bag_dir)
+    converter.getTopicDataWithPandas("/sg/wrench")
+    converter._closeDB()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM messages WHERE topic_id = 2 AND id > (SELECT MIN(id) FROM messages WHERE topic_id = 2)")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    assert _converter(bag_dir)._checkCache("/sg/wrench", "feather")[0] == "stale"
+
+
+def test_ns_window_on_cache_leaves_compressed_splits_alone(tmp_path):
+    pytest.importorskip("rclpy")
+    bag_dir = str(tmp_path / "compressed")
+    bag_benchmark.generate_bag(bag_dir, duration_sec=2.0, array_size=10, splits=2, compression="file")
+    whole = _converter(bag_dir).getTopicDataWithPandas("/sg/wrench")
+    start, end = int(whole["timestamp"].iloc[5]), int(whole["timestamp"].iloc[30])
+    expected = _converter(bag_dir).getTopicDataWithPandas("/sg/wrench", start=start, end=end, time_unit="ns", use_cache=False)
+
+    fromFile = _converter(bag_dir)
+    fromMemory = _converter(bag_dir)
+    fromMemory.frame_cache = frame_cache.FrameCache()
+    fromMemory.getTopicDataWithPandas("/sg/wrench")
+    for converter in (fromFile, fromMemory):
+        df = converter.getTopicDataWithPandas("/sg/wrench", start=start, end=end, time_unit="ns")
+        _assert_same_rows(df, expected)
+        assert not any(bag_file.decompressed for bag_file in converter.reader.files)